@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+
+from api.topology import RouterEndpoint
+
+"""
+Spreads requests across the healthy routers.
+
+Each router keeps a moving average of its round-trip time and a count of the
+requests currently running against it. A policy picks one of the healthy
+routers from those numbers:
+- "p2c": pick two routers at random and take the one with the lower cost,
+  where cost is the average round-trip time scaled by the requests in flight
+  (power of two choices: close to least-loaded without every request piling
+  onto the same router)
+- "least_outstanding": the router with the fewest requests in flight, ties
+  broken by the average round-trip time
+- "round_robin": each router in turn
+- "first": the first healthy router in the configured order (the old
+  behaviour, which sends everything to one router)
+
+A router that has not answered anything yet has no average, and is tried
+before any router that has. Health probe round trips are folded into the
+average as well, so a router that lost out once (say to a slow first
+request) is not starved by a stale number.
+"""
+
+POLICIES: tuple[str, ...] = (
+    "p2c", "least_outstanding", "round_robin", "first"
+)
+
+
+class RouterLoad:
+    """Round-trip time and requests in flight for one router."""
+    ewma_ms: float | None
+    in_flight: int
+    requests: int
+    errors: int
+
+    def __init__(self):
+        self.ewma_ms = None
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+    def cost(self) -> float:
+        if self.ewma_ms is None:
+            return 0.0
+        return self.ewma_ms * (self.in_flight + 1)
+
+    def snapshot(self) -> dict:
+        return {
+            "ewma_ms": self.ewma_ms,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class RouterBalancer:
+    policy: str
+    alpha: float
+    loads: dict[str, RouterLoad]
+
+    def __init__(self, policy: str, alpha: float):
+        if policy not in POLICIES:
+            raise ValueError(
+                f"Unknown router policy {policy!r}, expected one of "
+                f"{', '.join(POLICIES)}"
+            )
+        self.policy = policy
+        self.alpha = alpha
+        self.loads = {}
+        self._lock = threading.Lock()
+        self._next: int = 0
+
+    def _load(self, router: RouterEndpoint) -> RouterLoad:
+        load: RouterLoad | None = self.loads.get(router.container_name)
+        if load is None:
+            load = self.loads.setdefault(router.container_name, RouterLoad())
+        return load
+
+    def choose(self, routers: list[RouterEndpoint]) -> RouterEndpoint | None:
+        if not routers:
+            return None
+        if len(routers) == 1 or self.policy == "first":
+            return routers[0]
+        if self.policy == "round_robin":
+            with self._lock:
+                self._next += 1
+                return routers[self._next % len(routers)]
+        if self.policy == "least_outstanding":
+            return min(
+                routers,
+                key=lambda router: (
+                    self._load(router).in_flight,
+                    self._load(router).ewma_ms or 0.0
+                )
+            )
+        first, second = random.sample(routers, 2)
+        if self._load(second).cost() < self._load(first).cost():
+            return second
+        return first
+
+    def started(self, router: RouterEndpoint) -> float:
+        load: RouterLoad = self._load(router)
+        with self._lock:
+            load.in_flight += 1
+            load.requests += 1
+        return time.perf_counter()
+
+    def _observe(self, load: RouterLoad, elapsed_ms: float):
+        if load.ewma_ms is None:
+            load.ewma_ms = elapsed_ms
+        else:
+            load.ewma_ms += self.alpha * (elapsed_ms - load.ewma_ms)
+
+    def observe(self, router: RouterEndpoint, elapsed_ms: float):
+        load: RouterLoad = self._load(router)
+        with self._lock:
+            self._observe(load, elapsed_ms)
+
+    def finished(self, router: RouterEndpoint, start: float, ok: bool = True):
+        # failures count too: a router that times out should look slow
+        elapsed_ms: float = 1000 * (time.perf_counter() - start)
+        load: RouterLoad = self._load(router)
+        with self._lock:
+            load.in_flight -= 1
+            load.errors += not ok
+            self._observe(load, elapsed_ms)
+
+    def abandoned(self, router: RouterEndpoint):
+        # the request never reached the router
+        load: RouterLoad = self._load(router)
+        with self._lock:
+            load.in_flight -= 1
+            load.requests -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "routers": {
+                    name: load.snapshot() for name, load in self.loads.items()
+                },
+            }
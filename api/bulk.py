@@ -0,0 +1,78 @@
+import json
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+"""
+Request body parsing for /weather/post/bulk.
+
+The body is either a JSON array of reports or an NDJSON stream (one report
+per line, Content-Type application/x-ndjson). NDJSON is parsed as it arrives,
+so a large upload is written batch by batch instead of being held in memory
+first. Items that are not JSON objects are passed on as ParseError so they
+get an error result at their index instead of failing the whole request.
+"""
+
+NDJSON_TYPES: tuple[str, ...] = ("application/x-ndjson", "application/ndjson")
+
+
+class ParseError:
+    message: str
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+def _parse_line(line: bytes) -> dict | ParseError:
+    try:
+        doc = json.loads(line)
+    except ValueError as err:
+        return ParseError(f"Invalid JSON: {err}")
+    if not isinstance(doc, dict):
+        return ParseError("Report must be a JSON object")
+    return doc
+
+
+async def iter_documents(
+        request: Request
+) -> AsyncIterator[dict | ParseError]:
+    content_type: str = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip() in NDJSON_TYPES:
+        buffer: bytes = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(line)
+        if buffer.strip():
+            yield _parse_line(buffer)
+        return
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(body, list):
+        raise HTTPException(
+            status_code=400, detail="Expected a JSON array of reports"
+        )
+    for doc in body:
+        if isinstance(doc, dict):
+            yield doc
+        else:
+            yield ParseError("Report must be a JSON object")
+
+
+async def iter_batches(
+        items: AsyncIterator[dict | ParseError], batch_size: int
+) -> AsyncIterator[list[dict | ParseError]]:
+    batch: list[dict | ParseError] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
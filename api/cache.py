@@ -0,0 +1,122 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from api.config import CACHE_TTL_MS, CACHE_MAX_SIZE, CACHE_CELL_DEGREES
+from api.zones import EARTH_RADIUS_M, longitude_range
+
+"""
+Response cache for /weather/get keyed by a quantized geo cell.
+
+Query points are snapped to a grid of cell_degrees squares, so all the
+clients polling from one city share an entry. Entries expire after the TTL,
+the least recently used entry is evicted once the cache is full, and an
+insert drops every cell that could now have a nearer or newer station.
+
+The cache is per process: with several API workers an insert only
+invalidates the worker that handled it, and the TTL is the staleness bound
+for the others.
+"""
+
+MISS: object = object()
+
+
+class GeoCellCache:
+    ttl: float
+    max_size: int
+    cell_degrees: float
+    entries: OrderedDict
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+    def __init__(self, ttl: float, max_size: int, cell_degrees: float):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.cell_degrees = cell_degrees
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def cell(self, lon: float, lat: float) -> tuple[int, int]:
+        return (
+            math.floor(lon / self.cell_degrees),
+            math.floor(lat / self.cell_degrees)
+        )
+
+    def get(self, lon: float, lat: float, variant: tuple = ()) -> Any:
+        if not self.enabled:
+            return MISS
+        key: tuple = (*self.cell(lon, lat), *variant)
+        with self._lock:
+            entry: tuple[float, Any] | None = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return MISS
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, lon: float, lat: float, value: Any, variant: tuple = ()):
+        if not self.enabled:
+            return
+        key: tuple = (*self.cell(lon, lat), *variant)
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_near(self, lon: float, lat: float, radius_m: float):
+        """Drops every cell with a point within radius_m of (lon, lat)."""
+        if not self.enabled:
+            return
+        lon_min, lon_max = longitude_range(lon, lat, radius_m)
+        lat_delta: float = math.degrees(radius_m / EARTH_RADIUS_M)
+        x_min, y_min = self.cell(lon_min, lat - lat_delta)
+        x_max, y_max = self.cell(lon_max, lat + lat_delta)
+        with self._lock:
+            stale: list[tuple] = [
+                key for key in self.entries
+                if x_min <= key[0] <= x_max and y_min <= key[1] <= y_max
+            ]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl_s": self.ttl,
+                "cell_degrees": self.cell_degrees,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+WEATHER_CACHE: GeoCellCache = GeoCellCache(
+    ttl=CACHE_TTL_MS / 1000,
+    max_size=CACHE_MAX_SIZE,
+    cell_degrees=CACHE_CELL_DEGREES
+)
@@ -0,0 +1,183 @@
+import threading
+
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+from api.config import METRICS_ENABLED, MONGO_MAX_POOL_SIZE, \
+    MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS, MONGO_WAIT_QUEUE_TIMEOUT_MS, \
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS, \
+    MONGO_SOCKET_TIMEOUT_MS, MONGO_LOCAL_THRESHOLD_MS, PROFILE_SAMPLE_RATE, \
+    SLOW_QUERY_MS
+from api.metrics import METRICS, CommandMetrics, CallbackGauge
+from api.profiling import COMMAND_CAPTURE
+from api.topology import RouterEndpoint
+
+"""
+One long-lived, pooled MongoClient per router.
+
+MongoClient is thread-safe and keeps its own connection pool, so building one
+per request throws away topology discovery, the TCP handshake and auth on
+every call. The registry builds each client once and hands the same client
+to every request for that router.
+"""
+
+
+class PoolStatsListener(ConnectionPoolListener):
+    """Counts connection pool events for a single client."""
+    stats: dict[str, int]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            "open": 0,
+            "in_use": 0,
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "pool_clears": 0,
+        }
+
+    def _add(self, **deltas: int):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(pool_clears=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add(checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(in_use=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._add(in_use=-1)
+
+
+class ClientRegistry:
+    client_options: dict
+    clients: dict[str, MongoClient]
+    listeners: dict[str, PoolStatsListener]
+
+    def __init__(self, **client_options):
+        self.client_options = client_options
+        self.clients = {}
+        self.listeners = {}
+        self._lock = threading.Lock()
+
+    def register(self, router: RouterEndpoint) -> MongoClient:
+        with self._lock:
+            client: MongoClient | None = self.clients.get(
+                router.container_name
+            )
+            if client is None:
+                listener: PoolStatsListener = PoolStatsListener()
+                listeners: list = [listener]
+                if METRICS_ENABLED:
+                    listeners.append(CommandMetrics(
+                        router.container_name,
+                        {
+                            endpoint.address(): endpoint.container_name
+                            for endpoint in router.endpoints()
+                        }
+                    ))
+                if PROFILE_SAMPLE_RATE > 0 or SLOW_QUERY_MS > 0:
+                    listeners.append(COMMAND_CAPTURE)
+                client = MongoClient(
+                    router.mongo_url(),
+                    event_listeners=listeners,
+                    **self.client_options
+                )
+                self.clients[router.container_name] = client
+                self.listeners[router.container_name] = listener
+            return client
+
+    def get_client(self, router: RouterEndpoint) -> MongoClient:
+        # routers that were not registered at startup are added on first use
+        client: MongoClient | None = self.clients.get(router.container_name)
+        if client is None:
+            client = self.register(router)
+        return client
+
+    def pool_stats(self) -> dict[str, dict]:
+        return {
+            name: {
+                **listener.snapshot(),
+                "max_pool_size": self.client_options.get("maxPoolSize"),
+                "min_pool_size": self.client_options.get("minPoolSize"),
+            }
+            for name, listener in self.listeners.items()
+        }
+
+    def close(self):
+        with self._lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
+            self.listeners = {}
+
+
+CLIENT_REGISTRY: ClientRegistry = ClientRegistry(
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    # only matters for a seed list client (api.topology.RouterSeedList)
+    localThresholdMS=MONGO_LOCAL_THRESHOLD_MS,
+)
+
+
+POOL_GAUGES: tuple[str, ...] = ("open", "in_use")
+POOL_EVENTS: tuple[str, ...] = (
+    "created", "closed", "checkouts", "checkout_failures", "pool_clears"
+)
+
+METRICS.register(CallbackGauge(
+    "mongo_pool_connections", "Pooled connections, open and checked out.",
+    ("router", "state"),
+    lambda: {
+        (router, state): stats[state]
+        for router, stats in CLIENT_REGISTRY.pool_stats().items()
+        for state in POOL_GAUGES
+    }
+))
+METRICS.register(CallbackGauge(
+    "mongo_pool_events_total", "Connection pool events.",
+    ("router", "event"),
+    lambda: {
+        (router, event): stats[event]
+        for router, stats in CLIENT_REGISTRY.pool_stats().items()
+        for event in POOL_EVENTS
+    },
+    kind="counter"
+))
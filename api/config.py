@@ -0,0 +1,108 @@
+import os
+
+"""
+API settings, read once from environment variables at import time.
+
+Timeouts are in milliseconds to match the pymongo URI options they feed.
+"""
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default)
+
+
+# connection pool (one pooled MongoClient per router)
+MONGO_MAX_POOL_SIZE: int = _env_int("API_MONGO_MAX_POOL_SIZE", 100)
+MONGO_MIN_POOL_SIZE: int = _env_int("API_MONGO_MIN_POOL_SIZE", 0)
+MONGO_MAX_IDLE_TIME_MS: int = _env_int("API_MONGO_MAX_IDLE_TIME_MS", 60000)
+MONGO_WAIT_QUEUE_TIMEOUT_MS: int = _env_int(
+    "API_MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000
+)
+MONGO_CONNECT_TIMEOUT_MS: int = _env_int("API_MONGO_CONNECT_TIMEOUT_MS", 2000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS: int = _env_int(
+    "API_MONGO_SERVER_SELECTION_TIMEOUT_MS", 2000
+)
+MONGO_SOCKET_TIMEOUT_MS: int = _env_int("API_MONGO_SOCKET_TIMEOUT_MS", 10000)
+
+# "per_router" builds one client per router and picks a router per request;
+# "seed_list" builds one client seeded with every router and leaves picking
+# and failover to the driver, which uses routers whose round trip is within
+# MONGO_LOCAL_THRESHOLD_MS of the fastest
+ROUTER_MODE: str = _env_str("API_ROUTER_MODE", "per_router")
+MONGO_LOCAL_THRESHOLD_MS: int = _env_int(
+    "API_MONGO_LOCAL_THRESHOLD_MS", 15
+)
+
+# router health monitor
+ROUTER_PROBE_INTERVAL_MS: int = _env_int("API_ROUTER_PROBE_INTERVAL_MS", 1000)
+ROUTER_PROBE_TIMEOUT_MS: int = _env_int("API_ROUTER_PROBE_TIMEOUT_MS", 2000)
+
+# router selection: p2c, least_outstanding, round_robin or first (see
+# api/balancer.py), and the weight of the newest round trip in the average
+ROUTER_POLICY: str = _env_str("API_ROUTER_POLICY", "p2c")
+ROUTER_EWMA_ALPHA: float = _env_float("API_ROUTER_EWMA_ALPHA", 0.3)
+
+# blocking database calls run on a bounded thread pool off the event loop
+DB_WORKERS: int = _env_int("API_DB_WORKERS", 32)
+DB_MAX_PENDING: int = _env_int("API_DB_MAX_PENDING", 256)
+DB_TIMEOUT_MS: int = _env_int("API_DB_TIMEOUT_MS", 5000)
+
+# weather reads: primaryPreferred, nearest or secondaryPreferred. With
+# API_DATA_CENTRE set (a DataCentre.location, e.g. "winnipeg") reads prefer
+# members tagged with that data centre. Secondary reads may lag the primary
+# by up to API_MAX_STALENESS_S (-1 for no limit; otherwise at least 90).
+READ_PREFERENCE: str = _env_str("API_READ_PREFERENCE", "primaryPreferred")
+DATA_CENTRE: str = _env_str("API_DATA_CENTRE", "")
+MAX_STALENESS_S: int = _env_int("API_MAX_STALENESS_S", -1)
+
+# nearest weather station lookup; the radius has to reach the Toronto sample
+# from Windsor (about 465 km) for the demo queries in demo/simple_data.py
+SEARCH_RADIUS_M: int = _env_int("API_SEARCH_RADIUS_M", 500000)
+CANDIDATE_LIMIT: int = _env_int("API_CANDIDATE_LIMIT", 10)
+
+# weather history kept before the TTL index declared in api/indexes.py
+# deletes it (0 keeps everything and declares no TTL index)
+HISTORY_RETENTION_DAYS: int = _env_int("API_HISTORY_RETENTION_DAYS", 0)
+
+# /weather/get response cache (a TTL of 0 turns it off)
+CACHE_TTL_MS: int = _env_int("API_CACHE_TTL_MS", 30000)
+CACHE_MAX_SIZE: int = _env_int("API_CACHE_MAX_SIZE", 4096)
+CACHE_CELL_DEGREES: float = _env_float("API_CACHE_CELL_DEGREES", 0.05)
+
+# /weather/post/bulk
+BULK_BATCH_SIZE: int = _env_int("API_BULK_BATCH_SIZE", 1000)
+
+# /weather/post ingest: "direct" writes each report as it arrives, "buffered"
+# queues reports and writes them in batches. With buffered ingest the request
+# is acknowledged on "enqueue" or once its batch is written ("flush").
+INGEST_MODE: str = _env_str("API_INGEST_MODE", "direct")
+INGEST_DURABILITY: str = _env_str("API_INGEST_DURABILITY", "flush")
+INGEST_QUEUE_SIZE: int = _env_int("API_INGEST_QUEUE_SIZE", 10000)
+INGEST_BATCH_SIZE: int = _env_int("API_INGEST_BATCH_SIZE", 500)
+INGEST_FLUSH_MS: int = _env_int("API_INGEST_FLUSH_MS", 50)
+INGEST_ENQUEUE_TIMEOUT_MS: int = _env_int(
+    "API_INGEST_ENQUEUE_TIMEOUT_MS", 1000
+)
+
+# /metrics: request, router selection, driver command and pool metrics
+METRICS_ENABLED: bool = bool(_env_int("API_METRICS", 1))
+
+# /weather/get/batch
+BATCH_MAX_LOCATIONS: int = _env_int("API_BATCH_MAX_LOCATIONS", 500)
+
+# query profiling (api/profiling.py), off by default: the fraction of
+# /weather/get lookups that are explained, and the latency above which a
+# lookup is logged and explained (0 turns either off). At most
+# PROFILE_MAX_PENDING lookups wait for their explains at a time.
+PROFILE_SAMPLE_RATE: float = _env_float("API_PROFILE_SAMPLE_RATE", 0.0)
+SLOW_QUERY_MS: int = _env_int("API_SLOW_QUERY_MS", 0)
+PROFILE_LOG_SIZE: int = _env_int("API_PROFILE_LOG_SIZE", 100)
+PROFILE_MAX_PENDING: int = _env_int("API_PROFILE_MAX_PENDING", 16)
@@ -1,31 +1,148 @@
-from pymongo import MongoClient, ReadPreference
+import datetime
+import math
+from bisect import bisect_left, bisect_right
+
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+from pymongo.read_preferences import PrimaryPreferred, Nearest, \
+    SecondaryPreferred
 from pymongo.results import InsertOneResult
 
-from base.db_physical import MongoRouter
+from api.cache import WEATHER_CACHE
+from api.clients import CLIENT_REGISTRY
+from api.config import SEARCH_RADIUS_M, CANDIDATE_LIMIT, READ_PREFERENCE, \
+    DATA_CENTRE, MAX_STALENESS_S
+from api.latest import LATEST_COLLECTION_NAME, nearest_latest, \
+    refresh_latest, stations_in_range
+from api.schema import DB_NAME, COLLECTION_NAME
+from api.serialize import TIME_FMT
+from api.stats import FANOUT_STATS
+from api.topology import RouterEndpoint
+from api.zones import SHARD_KEY, EARTH_RADIUS_M, longitude_range, \
+    latitude_range, zones_for_range, zone_for_longitude, distance_m, \
+    group_by_cell
+
+# the member tag set by base.db_physical (DC_TAG)
+DC_TAG: str = "dc"
+
+READ_MODES: dict[str, type] = {
+    "primaryPreferred": PrimaryPreferred,
+    "nearest": Nearest,
+    "secondaryPreferred": SecondaryPreferred,
+}
+
+
+def read_preference(
+        mode: str, data_centre: str = "", max_staleness: int = -1
+) -> PrimaryPreferred | Nearest | SecondaryPreferred:
+    """
+    mongos applies the preference on every shard it reads from, so with a
+    data centre the read goes to that data centre's member of each shard.
+    The trailing empty tag set lets any member serve the read when the
+    local one is down.
+    """
+    if mode not in READ_MODES:
+        raise ValueError(
+            f"Unknown read preference {mode!r}, expected one of "
+            f"{', '.join(READ_MODES)}"
+        )
+    tag_sets: list[dict] | None = \
+        [{DC_TAG: data_centre}, {}] if data_centre else None
+    return READ_MODES[mode](tag_sets=tag_sets, max_staleness=max_staleness)
 
-DB_NAME: str = "env-canada"
-COLLECTION_NAME: str = "weather"
 
+READ_PREF: PrimaryPreferred | Nearest | SecondaryPreferred = read_preference(
+    READ_PREFERENCE, DATA_CENTRE, MAX_STALENESS_S
+)
 
-def read_client(router: MongoRouter) -> Collection:
-    url: str = router.mongo_url()
-    return MongoClient(url)\
+
+def read_client(router: RouterEndpoint) -> Collection:
+    return CLIENT_REGISTRY.get_client(router)\
         .get_database(DB_NAME)\
         .get_collection(
             COLLECTION_NAME,
-            read_preference=ReadPreference.PRIMARY_PREFERRED
+            read_preference=READ_PREF
     )
 
 
-def weather_doc_to_dict(weather_doc) -> dict:
-    data = {"_id": str(weather_doc["_id"])}
-    fields: list["str"] = [
-        "license", "timestamp", "geolocation",
-        "distanceToWeatherStation", "location", "dateTime", "warnings",
-        "currentConditions", "forecastGroup", "hourlyForecastGroup",
-        "yesterdayConditions", "riseSet", "almanac"
+def latest_client(router: RouterEndpoint) -> Collection:
+    return CLIENT_REGISTRY.get_client(router)\
+        .get_database(DB_NAME)\
+        .get_collection(
+            LATEST_COLLECTION_NAME,
+            read_preference=READ_PREF
+    )
+
+
+def write_client(router: RouterEndpoint) -> Collection:
+    return CLIENT_REGISTRY.get_client(router)\
+        .get_database(DB_NAME)\
+        .get_collection(
+            COLLECTION_NAME
+    )
+
+
+WEATHER_FIELDS: list[str] = [
+    "license", "timestamp", "geolocation",
+    "distanceToWeatherStation", "location", "dateTime", "warnings",
+    "currentConditions", "forecastGroup", "hourlyForecastGroup",
+    "yesterdayConditions", "riseSet", "almanac"
+]
+
+# computed by the lookup rather than stored
+DISTANCE_FIELD: str = "distanceToWeatherStation"
+
+# batch lookups fetch stations for one grid cell of points at a time, with
+# cells as wide as the search radius (in degrees of latitude)
+CELL_DEGREES: float = math.degrees(SEARCH_RADIUS_M / EARTH_RADIUS_M)
+
+
+def validate_fields(fields: list[str] | None) -> list[str] | None:
+    """
+    Fields may be top-level report fields or dotted paths into them, e.g.
+    "currentConditions.temperature". Returns them without duplicates or
+    paths inside other requested paths.
+    """
+    if fields is None:
+        return None
+    if not isinstance(fields, list) or not fields:
+        raise ValueError("fields must be a non-empty list")
+    for field in fields:
+        if not isinstance(field, str) \
+                or field.split(".")[0] not in WEATHER_FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        # the server rejects empty path segments and $-prefixed names in a
+        # projection
+        if any(
+                not segment or segment.startswith("$")
+                for segment in field.split(".")
+        ):
+            raise ValueError(f"Invalid field path: {field}")
+    # a path inside another requested path is already covered by it, and
+    # the server rejects both in one projection as a path collision
+    return [
+        field for field in dict.fromkeys(fields)
+        if not any(
+            field.startswith(f"{other}.")
+            for other in fields if other != field
+        )
     ]
+
+
+def weather_projection(fields: list[str] | None) -> dict:
+    selected: list[str] = WEATHER_FIELDS if fields is None else fields
+    # an empty projection would return the whole document
+    return {
+        field: 1 for field in selected if field != DISTANCE_FIELD
+    } or {"_id": 1}
+
+
+def weather_doc_to_dict(weather_doc, fields: list[str] | None = None) -> dict:
+    data = {"_id": str(weather_doc["_id"])}
+    if fields is None:
+        fields = WEATHER_FIELDS
+    else:
+        fields = list(dict.fromkeys(field.split(".")[0] for field in fields))
     for field in fields:
         try:
             data[field] = weather_doc[field]
@@ -34,15 +151,20 @@ def weather_doc_to_dict(weather_doc) -> dict:
     return data
 
 
-def check_weather(router: MongoRouter, lon: float, lat: float) -> dict:
-    url: str = router.mongo_url()
-    conn = MongoClient(url)
-    coll = conn.get_database(DB_NAME) \
-        .get_collection(
-        COLLECTION_NAME,
-        read_preference=ReadPreference.PRIMARY_PREFERRED
-    )
-    doc = coll.aggregate([
+def nearest_stations(
+        coll: Collection, lon: float, lat: float,
+        max_distance: float = SEARCH_RADIUS_M,
+        candidate_limit: int = CANDIDATE_LIMIT
+) -> list[dict]:
+    """
+    Distinct weather stations within max_distance (m) of the point, nearest
+    first. $geoNear walks the 2dsphere index outwards and stops after
+    candidate_limit reports, so the cost does not depend on how much
+    history each station has. The shard key range limits the query to the
+    shards whose zones can hold a station that close.
+    """
+    lon_min, lon_max = longitude_range(lon, lat, max_distance)
+    return list(coll.aggregate([
         {
             "$geoNear": {
                 "near": {
@@ -51,24 +173,307 @@ def check_weather(router: MongoRouter, lon: float, lat: float) -> dict:
                 },
                 "key": "geolocation",
                 "spherical": True,
+                "maxDistance": max_distance,
+                "query": {SHARD_KEY: {"$gte": lon_min, "$lte": lon_max}},
                 "distanceField": "distanceToWeatherStation"
             }
         },
+        {"$limit": candidate_limit},
         {
-            "$sort": {"distanceToWeatherStation": 1, "timestamp": -1}
+            "$group": {
+                "_id": "$geolocation",
+                SHARD_KEY: {"$first": f"${SHARD_KEY}"},
+                "distanceToWeatherStation": {
+                    "$min": "$distanceToWeatherStation"
+                }
+            }
+        },
+        {"$sort": {"distanceToWeatherStation": 1}},
+        {
+            "$project": {
+                "_id": 0,
+                "geolocation": "$_id",
+                SHARD_KEY: 1,
+                "distanceToWeatherStation": 1
+            }
         }
-    ]).next()
-    conn.close()
-    return weather_doc_to_dict(doc)
+    ]))
 
 
-def insert_weather(router: MongoRouter, data: dict) -> InsertOneResult:
-    url: str = router.mongo_url()
-    conn = MongoClient(url)
-    coll = conn.get_database(DB_NAME)\
-        .get_collection(
-        COLLECTION_NAME
+def latest_report(
+        coll: Collection, station: dict, projection: dict | None = None
+) -> dict | None:
+    # served by the {geolocation: 1, timestamp: -1} index, and sent to a
+    # single shard by the shard key equality
+    return coll.find_one(
+        {
+            SHARD_KEY: station[SHARD_KEY],
+            "geolocation": station["geolocation"]
+        },
+        projection,
+        sort=[("timestamp", -1)]
+    )
+
+
+def with_distance(
+        doc: dict, station: dict, fields: list[str] | None
+) -> dict:
+    # the projection already trimmed the report to the requested fields, so
+    # it is returned as decoded rather than copied by weather_doc_to_dict
+    if fields is None or DISTANCE_FIELD in fields:
+        doc[DISTANCE_FIELD] = station[DISTANCE_FIELD]
+    return doc
+
+
+def check_history(
+        coll: Collection, lon: float, lat: float, projection: dict,
+        fields: list[str] | None, zones: set[str]
+) -> dict | None:
+    """
+    The nearest station's latest report from the report history. Adds the
+    zones the search is routed to to zones.
+    """
+    zones.update(
+        zones_for_range(*longitude_range(lon, lat, SEARCH_RADIUS_M))
     )
-    output = coll.insert_one(data)
-    conn.close()
-    return output
+    for station in nearest_stations(coll, lon, lat):
+        doc = latest_report(coll, station, projection)
+        if doc is not None:
+            return with_distance(doc, station, fields)
+    return None
+
+
+def check_weather(
+        router: RouterEndpoint, lon: float, lat: float,
+        fields: list[str] | None = None
+) -> dict | None:
+    coll = read_client(router)
+    latest = latest_client(router)
+    # only the requested fields leave the shards
+    projection: dict = weather_projection(fields)
+    # every shard zone the request is routed to, recorded once at the end
+    zones: set[str] = set()
+    for station in nearest_latest(
+            latest, lon, lat, SEARCH_RADIUS_M, CANDIDATE_LIMIT
+    ):
+        zones.add(zone_for_longitude(station[SHARD_KEY]))
+        doc = coll.find_one(
+            {"_id": station["reportId"], SHARD_KEY: station[SHARD_KEY]},
+            projection
+        )
+        if doc is not None:
+            doc = with_distance(doc, station, fields)
+            break
+    else:
+        # weather_latest is empty or has not caught up (e.g. not rebuilt
+        # since reports were loaded around the API), so search the history
+        doc = check_history(coll, lon, lat, projection, fields, zones)
+    FANOUT_STATS.record(sorted(zones))
+    return doc
+
+
+def check_weather_many(
+        router: RouterEndpoint, points: list[tuple[float, float]],
+        fields: list[str] | None = None
+) -> list[dict | None]:
+    """
+    Latest report from the nearest station for each (lon, lat) point, in
+    order, or None where no station is within the search radius. Meant for
+    points in the same shard zone: one weather_latest query covers all of
+    them, and one query fetches every distinct station's report. Points
+    weather_latest has nothing for are searched in the history one at a
+    time, as check_weather does.
+    """
+    latest = latest_client(router)
+    nearest: list[tuple[dict, float] | None] = [None] * len(points)
+    # a zone is wide, so nearby points share one station fetch bounded by
+    # their search areas rather than the whole group sharing one band
+    for cell in group_by_cell(points, CELL_DEGREES).values():
+        lon_min, lon_max, lat_min, lat_max = 180.0, -180.0, 90.0, -90.0
+        for idx in cell:
+            lon, lat = points[idx]
+            low, high = longitude_range(lon, lat, SEARCH_RADIUS_M)
+            lon_min, lon_max = min(lon_min, low), max(lon_max, high)
+            low, high = latitude_range(lat, SEARCH_RADIUS_M)
+            lat_min, lat_max = min(lat_min, low), max(lat_max, high)
+
+        stations: list[dict] = sorted(
+            stations_in_range(latest, lon_min, lon_max, lat_min, lat_max),
+            key=lambda station: station[SHARD_KEY]
+        )
+        station_lons: list[float] = [
+            station[SHARD_KEY] for station in stations
+        ]
+        for idx in cell:
+            lon, lat = points[idx]
+            # only stations inside this point's longitude range can be in
+            # reach
+            low, high = longitude_range(lon, lat, SEARCH_RADIUS_M)
+            best: tuple[dict, float] | None = None
+            for station in stations[
+                bisect_left(station_lons, low):
+                bisect_right(station_lons, high)
+            ]:
+                s_lon, s_lat = station["geolocation"]["coordinates"][:2]
+                dist: float = distance_m(lon, lat, s_lon, s_lat)
+                if dist <= SEARCH_RADIUS_M \
+                        and (best is None or dist < best[1]):
+                    best = (station, dist)
+            nearest[idx] = best
+
+    # each station's report is fetched once however many points share it
+    wanted: dict = {
+        match[0]["reportId"]: match[0][SHARD_KEY]
+        for match in nearest if match is not None
+    }
+    reports: dict = {}
+    coll = read_client(router)
+    zones: set[str] = set()
+    if wanted:
+        zones.update(zones_for_range(
+            min(wanted.values()), max(wanted.values())
+        ))
+        reports = {
+            doc["_id"]: doc
+            for doc in coll.find(
+                {
+                    "_id": {"$in": list(wanted)},
+                    SHARD_KEY: {"$in": list(set(wanted.values()))}
+                },
+                weather_projection(fields)
+            )
+        }
+
+    results: list[dict | None] = []
+    for (lon, lat), match in zip(points, nearest):
+        doc: dict | None = None
+        if match is not None and match[0]["reportId"] in reports:
+            doc = with_distance(
+                dict(reports[match[0]["reportId"]]),
+                {DISTANCE_FIELD: match[1]},
+                fields
+            )
+        else:
+            doc = check_history(
+                coll, lon, lat, weather_projection(fields), fields, zones
+            )
+        results.append(doc)
+    FANOUT_STATS.record(sorted(zones))
+    return results
+
+
+def with_shard_key(data: dict) -> dict:
+    # reports without a shard key would all land in the lowest zone and be
+    # invisible to the shard key range on the read path
+    if "geolocation" in data:
+        try:
+            coordinates = data["geolocation"]["coordinates"]
+            valid: bool = len(coordinates) >= 2 and all(
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                for value in coordinates[:2]
+            )
+        except (KeyError, TypeError):
+            valid = False
+        if not valid:
+            raise ValueError(f"Invalid geolocation: {data['geolocation']!r}")
+        if SHARD_KEY not in data:
+            data[SHARD_KEY] = data["geolocation"]["coordinates"][0]
+    return data
+
+
+def parse_timestamp(value) -> datetime.datetime:
+    """
+    A report timestamp as a naive UTC datetime, which BSON stores as a date.
+    Accepts TIME_FMT, any other ISO 8601 string (no offset means UTC) and
+    datetimes.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)\
+                .replace(tzinfo=None)
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    try:
+        return datetime.datetime.strptime(value, TIME_FMT)
+    except ValueError:
+        pass
+    try:
+        parsed: datetime.datetime = datetime.datetime.fromisoformat(
+            value.replace("Z", "+00:00")
+        )
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value!r}") from None
+    return parse_timestamp(parsed)
+
+
+def with_timestamp(data: dict) -> dict:
+    # string timestamps only sort correctly while every writer uses the same
+    # format, and cannot be range-queried as times
+    if "timestamp" in data:
+        data["timestamp"] = parse_timestamp(data["timestamp"])
+    return data
+
+
+def normalize_report(data: dict) -> dict:
+    """Adds the shard key and stores the timestamp as a BSON date."""
+    return with_timestamp(with_shard_key(data))
+
+
+def invalidate_cached(docs: list[dict]):
+    # any cached lookup that could reach these stations may now be stale
+    stations: set[tuple] = {
+        tuple(doc["geolocation"]["coordinates"][:2])
+        for doc in docs if "geolocation" in doc
+    }
+    for lon, lat in stations:
+        WEATHER_CACHE.invalidate_near(lon, lat, SEARCH_RADIUS_M)
+
+
+def insert_weather(router: RouterEndpoint, data: dict) -> InsertOneResult:
+    coll = write_client(router)
+    data = normalize_report(data)
+    result = coll.insert_one(data)
+    refresh_latest(latest_client(router), [data])
+    invalidate_cached([data])
+    return result
+
+
+def insert_weather_many(
+        router: RouterEndpoint, docs: list[dict]
+) -> list[dict]:
+    """
+    Unordered bulk insert. Returns one result per document, in order: the
+    new _id, or the error that document hit.
+    """
+    coll = write_client(router)
+    errors: dict[int, str] = {}
+    for idx, doc in enumerate(docs):
+        try:
+            normalize_report(doc)
+        except ValueError as err:
+            errors[idx] = str(err)
+
+    # positions in docs of the reports that are sent
+    sent: list[int] = [idx for idx in range(len(docs)) if idx not in errors]
+    if sent:
+        try:
+            # insert_many assigns each document its _id before sending
+            coll.insert_many([docs[idx] for idx in sent], ordered=False)
+        except BulkWriteError as err:
+            errors.update({
+                sent[error["index"]]: error["errmsg"]
+                for error in err.details["writeErrors"]
+            })
+
+    inserted: list[dict] = [
+        doc for idx, doc in enumerate(docs) if idx not in errors
+    ]
+    refresh_latest(latest_client(router), inserted)
+    invalidate_cached(inserted)
+
+    return [
+        {"error": errors[idx]} if idx in errors else {"_id": str(doc["_id"])}
+        for idx, doc in enumerate(docs)
+    ]
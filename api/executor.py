@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import pymongo
+
+from api.config import DB_WORKERS, DB_MAX_PENDING, DB_TIMEOUT_MS
+
+"""
+Runs blocking pymongo calls without stalling the event loop.
+
+Calls go to a fixed-size thread pool. The number of calls that are running or
+queued is capped, and every call has a deadline. The deadline applies on both
+sides: the awaiting request gives up with asyncio.TimeoutError, and the worker
+thread runs inside pymongo.timeout() so the driver abandons the operation too.
+A request that is cancelled while its call is still queued never runs it.
+"""
+
+DB_EXECUTOR: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=DB_WORKERS, thread_name_prefix="api-db"
+)
+
+
+class ExecutorBusy(Exception):
+    pass
+
+
+class _PendingCounter:
+    count: int
+    limit: int
+
+    def __init__(self, limit: int):
+        self.count = 0
+        self.limit = limit
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.count >= self.limit:
+                return False
+            self.count += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.count -= 1
+
+
+_PENDING: _PendingCounter = _PendingCounter(DB_MAX_PENDING)
+
+
+def _call_with_deadline(
+        deadline: float, func: Callable, args: tuple
+) -> Any:
+    remaining: float = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError()
+    with pymongo.timeout(remaining):
+        return func(*args)
+
+
+async def run_db(
+        func: Callable, *args, timeout: float = DB_TIMEOUT_MS / 1000
+) -> Any:
+    if not _PENDING.acquire():
+        raise ExecutorBusy()
+    deadline: float = time.monotonic() + timeout
+    work = DB_EXECUTOR.submit(_call_with_deadline, deadline, func, args)
+    # the slot is held until the worker is really done, not just until the
+    # request stops waiting for it
+    work.add_done_callback(lambda _: _PENDING.release())
+    return await asyncio.wait_for(asyncio.wrap_future(work), timeout)
+
+
+def pending() -> int:
+    return _PENDING.count
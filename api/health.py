@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import pymongo
+
+from api.clients import CLIENT_REGISTRY
+from api.topology import RouterEndpoint
+
+"""
+Router health is probed in the background instead of on the request path.
+
+Every router is probed concurrently on a fixed interval and the results are
+kept in a table. Requests only read the precomputed list of healthy routers,
+and a request that fails against a router marks it down straight away rather
+than waiting for the next probe to notice.
+
+A probe is a ping over the router's pooled client, and its round-trip time
+is passed to on_probe (the balancer uses it to keep the average of a router
+that gets no requests current). Until the first sweep has finished every
+router is assumed healthy, so starting the monitor never blocks the API.
+"""
+
+
+class RouterHealthMonitor:
+    routers: list[RouterEndpoint]
+    interval: float
+    status: dict[str, bool]
+    healthy_routers: list[RouterEndpoint]
+
+    def __init__(
+            self, routers: list[RouterEndpoint], interval: float,
+            probe_timeout: float,
+            on_probe: Callable[[RouterEndpoint, float], None] | None = None
+    ):
+        # keep the configured order (it is the order of preference), but
+        # only probe each container once
+        unique: dict[str, RouterEndpoint] = {}
+        for router in routers:
+            unique.setdefault(router.container_name, router)
+        self.routers = list(unique.values())
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.on_probe = on_probe
+        self.status = {}
+        self.healthy_routers = list(self.routers)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(len(self.routers), 1),
+            thread_name_prefix="router-probe"
+        )
+
+    def _probe(self, router: RouterEndpoint) -> bool:
+        try:
+            start: float = time.perf_counter()
+            with pymongo.timeout(self.probe_timeout):
+                ping: dict = CLIENT_REGISTRY.get_client(router)\
+                    .admin.command("ping")
+            if self.on_probe is not None:
+                self.on_probe(router, 1000 * (time.perf_counter() - start))
+            return ping["ok"] == 1.0
+        except Exception:
+            return False
+
+    def _refresh(self):
+        # rebuilt on every change so readers never scan the table; routers
+        # that have not been probed yet count as healthy
+        self.healthy_routers = [
+            router for router in self.routers
+            if self.status.get(router.container_name, True)
+        ]
+
+    def probe_all(self):
+        results: list[bool] = list(
+            self._executor.map(self._probe, self.routers)
+        )
+        with self._lock:
+            for router, healthy in zip(self.routers, results):
+                self.status[router.container_name] = healthy
+            self._refresh()
+
+    def mark_down(self, router: RouterEndpoint):
+        with self._lock:
+            self.status[router.container_name] = False
+            self._refresh()
+
+    def healthy(self) -> list[RouterEndpoint]:
+        self.ensure_started()
+        return self.healthy_routers
+
+    def first_healthy(self) -> RouterEndpoint | None:
+        healthy_routers: list[RouterEndpoint] = self.healthy()
+        return healthy_routers[0] if healthy_routers else None
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="router-health", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        # the thread is a daemon and exits after its current sweep; waiting
+        # for a probe to time out would only delay shutdown
+        self._stop.set()
+        self._thread = None
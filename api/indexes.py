@@ -0,0 +1,266 @@
+import argparse
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable
+
+from pymongo.database import Database
+
+from api.clients import CLIENT_REGISTRY
+from api.config import HISTORY_RETENTION_DAYS
+from api.schema import DB_NAME, IndexSpec, declared_indexes, index_key
+from api.topology import load_routers
+
+"""
+A check of every shard against the indexes the API's queries need.
+
+INDEXES lists each index with the query it serves (declared in
+api/schema.py), and the retention TTL index when API_HISTORY_RETENTION_DAYS
+is set. IndexManager.compare reads $indexStats through a router, which
+reports every index on every shard that holds part of a collection, with its
+spec, whether it is still being built, and how often queries have used it
+since the shard started. Each shard's indexes are flagged:
+- missing: declared but not on the shard
+- building: declared and still being built
+- different: the declared key with other options (TTL, partial filter)
+- undeclared: on the shard but not declared; every write still pays for it
+- unused: not used by any query for at least min_unused_age (never the _id
+  or shard key index, which cannot be dropped)
+Nothing is dropped: undeclared and unused indexes are only reported.
+
+IndexManager.build creates one index at a time through a router and polls
+$currentOp for each shard's progress while it runs. Index builds only lock
+the collection briefly at the start and the end, so writes carry on during
+the build; one build at a time keeps the extra load on each shard to a
+single collection scan. A TTL that differs from its declaration is changed
+in place with collMod instead of rebuilding the index.
+
+Run from the project root:
+    python -m api.indexes [--apply] [--min-unused-hours 24]
+"""
+
+MISSING: str = "missing"
+BUILDING: str = "building"
+DIFFERENT: str = "different"
+UNDECLARED: str = "undeclared"
+UNUSED: str = "unused"
+
+ID_INDEX: str = "_id_"
+
+
+INDEXES: list[IndexSpec] = declared_indexes(HISTORY_RETENTION_DAYS)
+
+
+class IndexManager:
+    db: Database
+    specs: list[IndexSpec]
+    min_unused_age: datetime.timedelta
+
+    def __init__(
+            self, db: Database, specs: list[IndexSpec] | None = None,
+            min_unused_age: datetime.timedelta = datetime.timedelta(days=1)
+    ):
+        self.db = db
+        self.specs = INDEXES if specs is None else specs
+        self.min_unused_age = min_unused_age
+
+    def collections(self) -> list[str]:
+        return list(dict.fromkeys(spec.collection for spec in self.specs))
+
+    def _shard_key(self, collection: str) -> dict | None:
+        sharded: dict | None = self.db.client.get_database("config")\
+            .get_collection("collections")\
+            .find_one({"_id": f"{self.db.name}.{collection}"})
+        return sharded["key"] if sharded else None
+
+    def index_stats(self, collection: str) -> dict[str, list[dict]]:
+        """Every index on every shard that holds the collection, by shard."""
+        by_shard: dict[str, list[dict]] = {}
+        for stats in self.db.get_collection(collection).aggregate(
+                [{"$indexStats": {}}]
+        ):
+            by_shard.setdefault(stats.get("shard", ""), []).append(stats)
+        return by_shard
+
+    def compare(self) -> list[dict]:
+        """One row per index per shard, with the flags that apply to it."""
+        now: datetime.datetime = datetime.datetime.utcnow()
+        rows: list[dict] = []
+        for collection in self.collections():
+            specs: list[IndexSpec] = [
+                spec for spec in self.specs if spec.collection == collection
+            ]
+            shard_key: dict | None = self._shard_key(collection)
+            # a collection that does not exist yet is on no shard
+            by_shard: dict[str, list[dict]] = \
+                self.index_stats(collection) or {"": []}
+            for shard, indexes in by_shard.items():
+                for spec in specs:
+                    if not any(
+                            spec.matches_key(index["key"])
+                            for index in indexes
+                    ):
+                        rows.append({
+                            "collection": collection, "shard": shard,
+                            "index": spec.name, "flags": [MISSING],
+                        })
+
+                for index in indexes:
+                    flags: list[str] = []
+                    differences: list[str] = []
+                    declared: IndexSpec | None = next(
+                        (
+                            spec for spec in specs
+                            if spec.matches_key(index["key"])
+                        ),
+                        None
+                    )
+                    if declared is None:
+                        if index["name"] != ID_INDEX:
+                            flags.append(UNDECLARED)
+                    else:
+                        if index.get("building"):
+                            flags.append(BUILDING)
+                        differences = declared.differences(
+                            index.get("spec", {})
+                        )
+                        if differences:
+                            flags.append(DIFFERENT)
+
+                    accesses: dict = index.get("accesses", {})
+                    required: bool = index["name"] == ID_INDEX \
+                        or shard_key is not None \
+                        and index_key(index["key"].items()) \
+                        == index_key(shard_key.items())
+                    if not required and BUILDING not in flags \
+                            and accesses.get("ops") == 0 \
+                            and now - accesses.get("since", now) \
+                            >= self.min_unused_age:
+                        flags.append(UNUSED)
+
+                    rows.append({
+                        "collection": collection, "shard": shard,
+                        "index": index["name"], "flags": flags,
+                        "differences": differences,
+                        "ops": accesses.get("ops"),
+                        "since": accesses.get("since"),
+                    })
+        return rows
+
+    def build_progress(self, spec: IndexSpec) -> dict[str, str]:
+        """Per shard, how far the collection scan of a build has got."""
+        progress: dict[str, str] = {}
+        for op in self.db.client.admin.aggregate([
+            {"$currentOp": {"allUsers": True}},
+            {
+                "$match": {
+                    "ns": f"{self.db.name}.{spec.collection}",
+                    "command.createIndexes": {"$exists": True},
+                    "progress": {"$exists": True}
+                }
+            }
+        ]):
+            done, total = op["progress"]["done"], op["progress"]["total"]
+            progress[op.get("shard", "")] = \
+                f"{done}/{total} ({100 * done / max(total, 1):.0f}%)"
+        return progress
+
+    def build(
+            self, spec: IndexSpec, poll_s: float = 2.0,
+            on_progress: Callable[[IndexSpec, dict], None] | None = None
+    ) -> list[str]:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(
+                self.db.get_collection(spec.collection).create_indexes,
+                [spec.model()]
+            )
+            while not wait([future], timeout=poll_s).done:
+                if on_progress is not None:
+                    on_progress(spec, self.build_progress(spec))
+            return future.result()
+
+    def set_ttl(self, spec: IndexSpec) -> dict:
+        return self.db.command({
+            "collMod": spec.collection,
+            "index": {
+                "keyPattern": dict(spec.keys),
+                "expireAfterSeconds": spec.expire_after_s,
+            },
+        })
+
+    def apply(
+            self, rows: list[dict],
+            on_progress: Callable[[IndexSpec, dict], None] | None = None
+    ) -> list[str]:
+        """
+        Fixes TTLs and builds missing indexes. An index whose other options
+        differ is left alone: a build of the declared one would conflict
+        with it on the shards that have it, so it has to be dropped first.
+        Returns what was done.
+        """
+        done: list[str] = []
+        for spec in self.specs:
+            spec_rows: list[dict] = [
+                row for row in rows
+                if row["collection"] == spec.collection
+                and row["index"] == spec.name
+            ]
+            flags: set[str] = {
+                flag for row in spec_rows for flag in row["flags"]
+            }
+            differences: set[str] = {
+                option
+                for row in spec_rows for option in row.get("differences", [])
+            }
+            label: str = f"{spec.collection}.{spec.name}"
+            if differences - {"expireAfterSeconds"}:
+                done.append(
+                    f"skipped {label}: {', '.join(sorted(differences))} not "
+                    f"as declared, drop it and apply again"
+                )
+                continue
+            if differences:
+                self.set_ttl(spec)
+                done.append(f"set TTL of {label}")
+            if MISSING in flags:
+                self.build(spec, on_progress=on_progress)
+                done.append(f"built {label}")
+        return done
+
+
+def print_progress(spec: IndexSpec, progress: dict[str, str]):
+    shards: str = ", ".join(
+        f"{shard or 'primary'} {value}" for shard, value in progress.items()
+    ) or "waiting"
+    print(f"  {spec.collection}.{spec.name}: {shards}")
+
+
+def main(args: argparse.Namespace):
+    db: Database = CLIENT_REGISTRY.get_client(load_routers()[0])\
+        .get_database(DB_NAME)
+    manager: IndexManager = IndexManager(
+        db, min_unused_age=datetime.timedelta(hours=args.min_unused_hours)
+    )
+
+    print("Comparing declared indexes with every shard...")
+    start: float = time.perf_counter()
+    rows: list[dict] = manager.compare()
+    print(f"  Done in {time.perf_counter() - start:.2f} s")
+    for row in rows:
+        ops: str = "" if row.get("ops") is None else f"{row['ops']} ops"
+        print(f"  {row['collection']:<16} {row['shard'] or '-':<10} "
+              f"{row['index']:<40} {', '.join(row['flags']) or 'ok':<20} "
+              f"{ops}")
+
+    if args.apply:
+        print("Applying...")
+        for action in manager.apply(rows, on_progress=print_progress):
+            print(f"  {action}")
+    CLIENT_REGISTRY.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apply", action="store_true")
+    parser.add_argument("--min-unused-hours", type=float, default=24)
+    main(parser.parse_args())
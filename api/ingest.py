@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from bson import ObjectId
+
+"""
+Write-behind buffer for single-report posts.
+
+Reports are put on a bounded queue and a background task writes them in
+batches, flushing when a batch is full or when the oldest queued report has
+waited flush_interval seconds. Durability is either:
+- "enqueue": the request is acknowledged as soon as the report is queued.
+  Reports still queued when the process dies are lost.
+- "flush": the request waits until its batch has been written and gets that
+  report's own result.
+When the queue is full, submit waits up to enqueue_timeout for space and then
+raises BufferFull, so overload is pushed back to the client. drain() stops
+new submissions and writes out everything still queued.
+"""
+
+LOGGER = logging.getLogger(__name__)
+
+DURABILITY_ENQUEUE: str = "enqueue"
+DURABILITY_FLUSH: str = "flush"
+
+# writes a batch and returns (router name, one result per report)
+BatchWriter = Callable[[list[dict]], Awaitable[tuple[str, list[dict]]]]
+
+
+class BufferFull(Exception):
+    pass
+
+
+class BufferClosed(Exception):
+    pass
+
+
+class WriteBehindBuffer:
+    write: BatchWriter
+    durability: str
+    max_size: int
+    batch_size: int
+    flush_interval: float
+    enqueue_timeout: float
+    stats: dict[str, int]
+
+    def __init__(
+            self,
+            write: BatchWriter,
+            durability: str,
+            max_size: int,
+            batch_size: int,
+            flush_interval: float,
+            enqueue_timeout: float
+    ):
+        if durability not in (DURABILITY_ENQUEUE, DURABILITY_FLUSH):
+            raise ValueError(f"Unknown ingest durability: {durability}")
+        self.write = write
+        self.durability = durability
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "rejected": 0,
+        }
+
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._accepting: bool = False
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    def start(self):
+        # the queue belongs to the running event loop, so it is only made here
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._accepting = True
+
+    async def submit(self, doc: dict) -> dict:
+        if not self._accepting:
+            raise BufferClosed()
+        # the _id is known up front so "enqueue" can still return it
+        doc.setdefault("_id", ObjectId())
+        future: asyncio.Future | None = None
+        if self.durability == DURABILITY_FLUSH:
+            future = asyncio.get_running_loop().create_future()
+
+        try:
+            await asyncio.wait_for(
+                self._queue.put((doc, future)), self.enqueue_timeout
+            )
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise BufferFull()
+        self.stats["enqueued"] += 1
+
+        if future is None:
+            return {"_id": str(doc["_id"]), "router": None}
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: list[tuple] = [await self._queue.get()]
+            deadline: float = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining: float = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), remaining)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple]):
+        try:
+            router_name, results = await self.write(
+                [doc for doc, _ in batch]
+            )
+        except Exception as err:
+            self.stats["failed"] += len(batch)
+            LOGGER.exception("Failed to write %d buffered reports", len(batch))
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(err)
+        else:
+            self.stats["batches"] += 1
+            for (_, future), result in zip(batch, results):
+                self.stats["written" if "_id" in result else "failed"] += 1
+                if future is not None and not future.done():
+                    future.set_result({**result, "router": router_name})
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    async def drain(self):
+        if not self._accepting:
+            return
+        self._accepting = False
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "durability": self.durability,
+        }
@@ -0,0 +1,161 @@
+from pymongo import UpdateOne, GEOSPHERE
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from api.schema import LATEST_COLLECTION_NAME
+from api.zones import SHARD_KEY
+
+"""
+weather_latest keeps one small document per weather station pointing at that
+station's newest report in the weather collection.
+
+Almost every read wants current conditions at the nearest station, and this
+collection has one document per station instead of one per report, so the
+geo lookup runs against a collection that stays in RAM however much history
+builds up.
+
+Each write is guarded by timestamp: the upsert only matches a station
+document that is older than the report. If a newer report is already stored
+the filter misses, the upsert collides on _id, and the duplicate key error is
+ignored, so out-of-order inserts never overwrite newer data.
+"""
+
+DUPLICATE_KEY: int = 11000
+
+# $geoNear on a collection without a 2dsphere index
+INDEX_NOT_FOUND: int = 27
+NO_QUERY_EXECUTION_PLANS: int = 291
+
+
+def station_id(doc: dict) -> dict:
+    lon, lat = doc["geolocation"]["coordinates"][:2]
+    return {"lon": lon, "lat": lat}
+
+
+def latest_entry(doc: dict) -> dict:
+    return {
+        "geolocation": doc["geolocation"],
+        SHARD_KEY: doc[SHARD_KEY],
+        "timestamp": doc["timestamp"],
+        "reportId": doc["_id"],
+    }
+
+
+def refresh_latest(latest: Collection, docs: list[dict]):
+    ops: list[UpdateOne] = [
+        UpdateOne(
+            {
+                "_id": station_id(doc),
+                # a string timestamp predates BSON dates (api.migrate) and
+                # would never compare $lt a date
+                "$or": [
+                    {"timestamp": {"$lt": doc["timestamp"]}},
+                    {"timestamp": {"$type": "string"}}
+                ]
+            },
+            {"$set": latest_entry(doc)},
+            upsert=True
+        )
+        for doc in docs
+        if "geolocation" in doc and "timestamp" in doc and SHARD_KEY in doc
+    ]
+    if not ops:
+        return
+    try:
+        latest.bulk_write(ops, ordered=False)
+    except BulkWriteError as err:
+        # lost the timestamp guard to a newer report: nothing to do
+        errors: list[dict] = err.details["writeErrors"]
+        if any(error["code"] != DUPLICATE_KEY for error in errors):
+            raise
+
+
+def nearest_latest(
+        latest: Collection, lon: float, lat: float,
+        max_distance: float, candidate_limit: int
+) -> list[dict]:
+    """
+    The nearest stations, or none while weather_latest has no 2dsphere
+    index: the first insert creates the collection, and the index only
+    once api.indexes is applied. Callers then search the history.
+    """
+    try:
+        return list(latest.aggregate([
+            {
+                "$geoNear": {
+                    "near": {
+                        "type": "Point",
+                        "coordinates": [lon, lat]
+                    },
+                    "key": "geolocation",
+                    "spherical": True,
+                    "maxDistance": max_distance,
+                    "distanceField": "distanceToWeatherStation"
+                }
+            },
+            {"$limit": candidate_limit}
+        ]))
+    except OperationFailure as err:
+        if err.code not in (INDEX_NOT_FOUND, NO_QUERY_EXECUTION_PLANS):
+            raise
+        return []
+
+
+def stations_in_range(
+        latest: Collection, lon_min: float, lon_max: float,
+        lat_min: float = -90.0, lat_max: float = 90.0
+) -> list[dict]:
+    # served by the stationLongitude index; the latitude bound is checked on
+    # each station in the band, so far away ones are not sent back
+    return list(latest.find(
+        {
+            SHARD_KEY: {"$gte": lon_min, "$lte": lon_max},
+            "geolocation.coordinates.1": {"$gte": lat_min, "$lte": lat_max}
+        },
+        {"geolocation": 1, SHARD_KEY: 1, "reportId": 1}
+    ))
+
+
+def rebuild_latest(db: Database, weather_collection: str):
+    """Regenerates weather_latest from the full report history."""
+    latest: Collection = db.get_collection(LATEST_COLLECTION_NAME)
+    latest.create_index([("geolocation", GEOSPHERE)])
+    latest.create_index([(SHARD_KEY, 1)])
+    db.get_collection(weather_collection).aggregate([
+        {
+            "$match": {
+                "geolocation": {"$exists": True},
+                "timestamp": {"$exists": True},
+                SHARD_KEY: {"$exists": True}
+            }
+        },
+        {"$sort": {"timestamp": -1}},
+        {
+            "$group": {
+                "_id": {
+                    "lon": {"$arrayElemAt": ["$geolocation.coordinates", 0]},
+                    "lat": {"$arrayElemAt": ["$geolocation.coordinates", 1]}
+                },
+                "geolocation": {"$first": "$geolocation"},
+                SHARD_KEY: {"$first": f"${SHARD_KEY}"},
+                "timestamp": {"$first": "$timestamp"},
+                "reportId": {"$first": "$_id"}
+            }
+        },
+        # $out keeps the existing indexes of the target collection
+        {"$out": LATEST_COLLECTION_NAME}
+    ], allowDiskUse=True)
+
+
+if __name__ == "__main__":
+    from api.clients import CLIENT_REGISTRY
+    from api.db import DB_NAME, COLLECTION_NAME
+    from api.topology import load_routers
+
+    print(f"Rebuilding {LATEST_COLLECTION_NAME} from {COLLECTION_NAME}...")
+    rebuild_latest(
+        CLIENT_REGISTRY.get_client(load_routers()[0]).get_database(DB_NAME),
+        COLLECTION_NAME
+    )
+    print("  Done")
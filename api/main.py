@@ -1,35 +1,347 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from typing import Any, Callable
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.encoders import jsonable_encoder
-from starlette.responses import JSONResponse
+from pymongo.errors import ConnectionFailure, PyMongoError, \
+    ServerSelectionTimeoutError
+from starlette.responses import JSONResponse, Response
 
-from api.db import read_client, check_weather, insert_weather
-from base.db_physical import MongoRouter
-from demo.D00_init_server_setup import ROUTERS
+from api.balancer import RouterBalancer
+from api.bulk import iter_documents, iter_batches, ParseError
+from api.cache import WEATHER_CACHE, MISS
+from api.clients import CLIENT_REGISTRY
+from api.config import ROUTER_PROBE_INTERVAL_MS, ROUTER_PROBE_TIMEOUT_MS, \
+    ROUTER_MODE, ROUTER_POLICY, ROUTER_EWMA_ALPHA, DATA_CENTRE, \
+    METRICS_ENABLED, BULK_BATCH_SIZE, BATCH_MAX_LOCATIONS, INGEST_MODE, \
+    INGEST_DURABILITY, INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE, \
+    INGEST_FLUSH_MS, INGEST_ENQUEUE_TIMEOUT_MS, PROFILE_SAMPLE_RATE, \
+    SLOW_QUERY_MS, PROFILE_LOG_SIZE, PROFILE_MAX_PENDING
+from api.db import read_client, check_weather, insert_weather, \
+    insert_weather_many, validate_fields, check_weather_many, \
+    normalize_report
+from api.executor import run_db, ExecutorBusy
+from api.health import RouterHealthMonitor
+from api.ingest import WriteBehindBuffer, BufferFull, BufferClosed
+from api.metrics import METRICS, CONTENT_TYPE, ROUTER_SELECTIONS, \
+    MetricsMiddleware
+from api.profiling import QueryProfiler
+from api.serialize import encode_json, json_response
+from api.stats import FANOUT_STATS
+from api.topology import RouterEndpoint, RouterSeedList, load_routers
+from api.zones import group_by_zone
 
 app = FastAPI()
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# reading the topology is cheap; clients connect lazily on first use
+ROUTERS: list[RouterEndpoint] = load_routers()
+
+BALANCER: RouterBalancer = RouterBalancer(ROUTER_POLICY, ROUTER_EWMA_ALPHA)
+
+HEALTH_MONITOR: RouterHealthMonitor = RouterHealthMonitor(
+    ROUTERS,
+    interval=ROUTER_PROBE_INTERVAL_MS / 1000,
+    probe_timeout=ROUTER_PROBE_TIMEOUT_MS / 1000,
+    on_probe=BALANCER.observe
+)
+
+# in seed list mode the driver does the router health checks and selection
+SEED_LIST: RouterSeedList | None = \
+    RouterSeedList(ROUTERS) if ROUTER_MODE == "seed_list" else None
+
+QUERY_PROFILER: QueryProfiler = QueryProfiler(
+    CLIENT_REGISTRY.get_client,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    slow_ms=SLOW_QUERY_MS,
+    log_size=PROFILE_LOG_SIZE,
+    max_pending=PROFILE_MAX_PENDING
+)
+
+# names the router that served a request, so load tests can count the split
+ROUTER_HEADER: str = "X-Router"
+
+
+@app.on_event("startup")
+def start_health_monitor():
+    if SEED_LIST is None:
+        HEALTH_MONITOR.ensure_started()
+
+
+@app.on_event("startup")
+async def start_ingest():
+    if INGEST_MODE == "buffered":
+        INGEST_BUFFER.start()
+
+
+@app.on_event("shutdown")
+async def drain_ingest():
+    # runs before the clients are closed so queued reports are written
+    await INGEST_BUFFER.drain()
+
 
-def get_router() -> MongoRouter:
-    for router in ROUTERS:
-        if router.healthy():
-            return router
-    raise HTTPException(status_code=500, detail="No routers online")
+@app.on_event("shutdown")
+def close_clients():
+    HEALTH_MONITOR.stop()
+    QUERY_PROFILER.stop()
+    CLIENT_REGISTRY.close()
+
+
+def get_router() -> RouterEndpoint:
+    if SEED_LIST is not None:
+        ROUTER_SELECTIONS.inc(SEED_LIST.container_name, "selected")
+        return SEED_LIST
+    healthy: list[RouterEndpoint] = HEALTH_MONITOR.healthy()
+    # stay in our own data centre while it has a router up
+    local: list[RouterEndpoint] = [
+        router for router in healthy if router.location == DATA_CENTRE
+    ] if DATA_CENTRE else []
+    router: RouterEndpoint | None = BALANCER.choose(local or healthy)
+    if router is None:
+        ROUTER_SELECTIONS.inc("", "none_healthy")
+        raise HTTPException(status_code=500, detail="No routers online")
+    ROUTER_SELECTIONS.inc(router.container_name, "selected")
+    return router
+
+
+def router_failed(router: RouterEndpoint) -> HTTPException:
+    ROUTER_SELECTIONS.inc(router.container_name, "failed")
+    if router is not SEED_LIST:
+        HEALTH_MONITOR.mark_down(router)
+    return HTTPException(
+        status_code=503, detail=f"Router {router.container_name} unavailable"
+    )
+
+
+async def call_db(router: RouterEndpoint, func: Callable, *args) -> Any:
+    start: float = BALANCER.started(router)
+    reached: bool = True
+    ok: bool = False
+    try:
+        result = await run_db(func, router, *args)
+        ok = True
+        return result
+    except ExecutorBusy:
+        BALANCER.abandoned(router)
+        reached = False
+        raise HTTPException(status_code=503, detail="Too many requests")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database timed out")
+    except PyMongoError as err:
+        # a router that cannot be reached also times out, but server
+        # selection failing means it is down rather than slow
+        if isinstance(err, ServerSelectionTimeoutError):
+            raise router_failed(router)
+        if err.timeout:
+            raise HTTPException(status_code=504, detail="Database timed out")
+        if isinstance(err, ConnectionFailure):
+            raise router_failed(router)
+        raise
+    finally:
+        if reached:
+            BALANCER.finished(router, start, ok)
+
+
+async def write_batch(docs: list[dict]) -> tuple[str, list[dict]]:
+    router = get_router()
+    results = await call_db(router, insert_weather_many, docs)
+    return router.container_name, results
+
+
+INGEST_BUFFER: WriteBehindBuffer = WriteBehindBuffer(
+    write=write_batch,
+    durability=INGEST_DURABILITY,
+    max_size=INGEST_QUEUE_SIZE,
+    batch_size=INGEST_BATCH_SIZE,
+    flush_interval=INGEST_FLUSH_MS / 1000,
+    enqueue_timeout=INGEST_ENQUEUE_TIMEOUT_MS / 1000
+)
 
 
 @app.post("/weather/get")
 async def get_weather(loc: dict):
+    try:
+        fields: list[str] | None = validate_fields(loc.get("fields"))
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    variant: tuple = tuple(sorted(fields)) if fields else ()
+
+    # the cache holds encoded responses, so a hit skips serialization too
+    body = WEATHER_CACHE.get(loc["lon"], loc["lat"], variant)
+    headers: dict[str, str] = {}
+    if body is MISS:
+        router = get_router()
+        headers[ROUTER_HEADER] = router.container_name
+        weather = await call_db(
+            router, QUERY_PROFILER.wrap(check_weather), loc["lon"],
+            loc["lat"], fields
+        )
+        body = None if weather is None else encode_json(weather)
+        WEATHER_CACHE.put(loc["lon"], loc["lat"], body, variant)
+    if body is None:
+        raise HTTPException(
+            status_code=404, detail="No weather station within range",
+            headers=headers
+        )
+    return json_response(body, headers=headers)
+
+
+@app.post("/weather/get/batch")
+async def get_weather_batch(query: dict):
+    try:
+        fields: list[str] | None = validate_fields(query.get("fields"))
+        points: list[tuple[float, float]] = [
+            (float(loc["lon"]), float(loc["lat"]))
+            for loc in query["locations"]
+        ]
+    except (KeyError, TypeError, ValueError) as err:
+        raise HTTPException(status_code=400, detail=f"Invalid query: {err}")
+    if len(points) > BATCH_MAX_LOCATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_LOCATIONS} locations per request"
+        )
+
+    # one query per shard zone, all zones in parallel
+    groups: list[list[int]] = list(group_by_zone(points).values())
     router = get_router()
-    return check_weather(router, loc["lon"], loc["lat"])
+    group_results = await asyncio.gather(*[
+        call_db(
+            router, check_weather_many, [points[idx] for idx in group], fields
+        )
+        for group in groups
+    ])
+
+    results: list[dict | None] = [None] * len(points)
+    for group, weather in zip(groups, group_results):
+        for idx, doc in zip(group, weather):
+            results[idx] = doc
+    return json_response(
+        encode_json(results), headers={ROUTER_HEADER: router.container_name}
+    )
 
 
 @app.post("/weather/post")
 async def post_weather(data: dict):
+    try:
+        # rejected here rather than counted against the router by call_db,
+        # or acknowledged by the ingest buffer and then dropped on write
+        normalize_report(data)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+
+    if INGEST_BUFFER.running:
+        try:
+            result = await INGEST_BUFFER.submit(data)
+        except BufferFull:
+            raise HTTPException(status_code=503, detail="Ingest queue full")
+        except BufferClosed:
+            raise HTTPException(status_code=503, detail="Shutting down")
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        return JSONResponse(content=jsonable_encoder(result))
+
     router = get_router()
-    result = insert_weather(router, data)
+    result = await call_db(router, insert_weather, data)
     response = {
         "router": router.container_name,
         "_id": str(result.inserted_id)
     }
 
-    return JSONResponse(content=jsonable_encoder(response))
+    return JSONResponse(
+        content=jsonable_encoder(response),
+        headers={ROUTER_HEADER: router.container_name}
+    )
+
+
+@app.post("/weather/post/bulk")
+async def post_weather_bulk(request: Request):
+    results: list[dict] = []
+    inserted: int = 0
+    routers: set[str] = set()
+
+    async for batch in iter_batches(iter_documents(request), BULK_BATCH_SIZE):
+        batch_results: list[dict] = [
+            {"error": item.message} if isinstance(item, ParseError) else None
+            for item in batch
+        ]
+        docs: list[dict] = [
+            item for item in batch if not isinstance(item, ParseError)
+        ]
+        if docs:
+            try:
+                router = get_router()
+                written = iter(
+                    await call_db(router, insert_weather_many, docs)
+                )
+                routers.add(router.container_name)
+            except HTTPException as err:
+                # this batch failed as a whole; later ones may still succeed
+                written = iter([{"error": err.detail} for _ in docs])
+            batch_results = [
+                result if result is not None else next(written)
+                for result in batch_results
+            ]
+
+        for result in batch_results:
+            result["index"] = len(results)
+            inserted += "_id" in result
+            results.append(result)
+
+    response = {
+        "routers": sorted(routers),
+        "inserted": inserted,
+        "failed": len(results) - inserted,
+        "results": results
+    }
+    return json_response(encode_json(response))
+
+
+@app.get("/admin/pools")
+async def pool_stats():
+    return CLIENT_REGISTRY.pool_stats()
+
+
+@app.get("/admin/cache")
+async def cache_stats():
+    return WEATHER_CACHE.stats()
+
+
+@app.get("/admin/fanout")
+async def fanout_stats():
+    return FANOUT_STATS.snapshot()
+
+
+@app.get("/admin/ingest")
+async def ingest_stats():
+    return INGEST_BUFFER.snapshot()
+
+
+@app.get("/admin/routers")
+async def router_status():
+    if SEED_LIST is not None:
+        # the driver's own view: which routers it can currently use
+        topology = CLIENT_REGISTRY.get_client(SEED_LIST).topology_description
+        return {
+            f"{host}:{port}": server.server_type_name == "Mongos"
+            for (host, port), server
+            in topology.server_descriptions().items()
+        }
+    return HEALTH_MONITOR.status
+
+
+@app.get("/admin/balancer")
+async def balancer_stats():
+    return BALANCER.snapshot()
+
+
+@app.get("/admin/queries")
+async def query_profile():
+    return QUERY_PROFILER.snapshot()
+
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=METRICS.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,278 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from pymongo.monitoring import CommandListener
+
+"""
+Metrics in the Prometheus text format, served at /metrics.
+
+Kept to what the API needs instead of depending on prometheus_client:
+counters and histograms with labels, plus gauges read from a callback at
+scrape time (the connection pools already count their own events). Every
+update is a dict lookup and an addition under one lock per metric, and
+histograms find their bucket with a bisect, so recording costs about a
+microsecond (see bench/metrics.py).
+
+Recorded:
+- api_requests_total, api_request_duration_seconds: per endpoint, by method
+  and status, from MetricsMiddleware
+- api_router_selections_total: what get_router did, by router and outcome
+- mongo_command_duration_seconds, mongo_command_failures_total: every
+  driver command, by router and command name, from CommandMetrics
+- mongo_pool_*: the connection pool counts of every router's client
+"""
+
+# starlette adds "; charset=utf-8"
+CONTENT_TYPE: str = "text/plain; version=0.0.4"
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")\
+        .replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs: list[str] = [
+        f'{name}="{_escape(str(value))}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    name: str
+    help: str
+    label_names: tuple[str, ...]
+    values: dict[tuple, float]
+
+    def __init__(self, name: str, help: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines: list[str] = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            values: list = list(self.values.items())
+        for labels, value in values:
+            lines.append(
+                f"{self.name}{_labels(self.label_names, labels)} {value}"
+            )
+        return lines
+
+
+class Histogram:
+    name: str
+    help: str
+    label_names: tuple[str, ...]
+    buckets: tuple[float, ...]
+    # per label set: a count per bucket (the last is +Inf), and the sum
+    values: dict[tuple, list]
+
+    def __init__(
+            self, name: str, help: str, label_names: Iterable[str] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        idx: int = bisect_left(self.buckets, value)
+        with self._lock:
+            counts: list | None = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[idx] += 1
+            counts[-1] += value
+
+    def render(self) -> list[str]:
+        lines: list[str] = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            values: list = [
+                (labels, list(counts))
+                for labels, counts in self.values.items()
+            ]
+        for labels, counts in values:
+            # buckets are cumulative in the exposition format
+            total: int = 0
+            for bound, count in zip(
+                    [*map(str, self.buckets), "+Inf"], counts[:-1]
+            ):
+                total += count
+                label_text: str = _labels(
+                    self.label_names, labels, f'le="{bound}"'
+                )
+                lines.append(f"{self.name}_bucket{label_text} {total}")
+            label_text = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {counts[-1]}")
+            lines.append(f"{self.name}_count{label_text} {total}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge values read when scraped: callback() -> {labels: value}."""
+    name: str
+    help: str
+    label_names: tuple[str, ...]
+
+    def __init__(
+            self, name: str, help: str, label_names: Iterable[str],
+            callback: Callable[[], dict[tuple, float]],
+            kind: str = "gauge"
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        lines: list[str] = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for labels, value in self.callback().items():
+            lines.append(
+                f"{self.name}{_labels(self.label_names, labels)} {value}"
+            )
+        return lines
+
+
+class MetricsRegistry:
+    metrics: list
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+METRICS: MetricsRegistry = MetricsRegistry()
+
+REQUESTS: Counter = METRICS.register(Counter(
+    "api_requests_total", "HTTP requests by endpoint, method and status.",
+    ("endpoint", "method", "status")
+))
+REQUEST_DURATION: Histogram = METRICS.register(Histogram(
+    "api_request_duration_seconds", "HTTP request latency by endpoint.",
+    ("endpoint", "method")
+))
+ROUTER_SELECTIONS: Counter = METRICS.register(Counter(
+    "api_router_selections_total",
+    "Router selection outcomes (selected, none_healthy, failed).",
+    ("router", "outcome")
+))
+COMMAND_DURATION: Histogram = METRICS.register(Histogram(
+    "mongo_command_duration_seconds",
+    "Driver command latency by router and command.",
+    ("router", "command")
+))
+COMMAND_FAILURES: Counter = METRICS.register(Counter(
+    "mongo_command_failures_total", "Driver commands that failed.",
+    ("router", "command")
+))
+
+
+class CommandMetrics(CommandListener):
+    """
+    Times every command a client sends. addresses maps "host:port" to a
+    router name, so a seed list client reports each router separately.
+    """
+    router: str
+    addresses: dict[str, str]
+
+    def __init__(self, router: str, addresses: dict[str, str] | None = None):
+        self.router = router
+        self.addresses = addresses or {}
+
+    def _router(self, event) -> str:
+        host, port = event.connection_id
+        return self.addresses.get(f"{host}:{port}", self.router)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        COMMAND_DURATION.observe(
+            event.duration_micros / 1e6, self._router(event),
+            event.command_name
+        )
+
+    def failed(self, event):
+        router: str = self._router(event)
+        COMMAND_DURATION.observe(
+            event.duration_micros / 1e6, router, event.command_name
+        )
+        COMMAND_FAILURES.inc(router, event.command_name)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no per-request task or body wrapping, unlike
+    BaseHTTPMiddleware). Paths that are not the app's routes are counted
+    as "other", so stray URLs cannot grow the label sets without bound.
+    """
+    endpoints: set[str] | None
+
+    def __init__(self, app):
+        self.app = app
+        self.endpoints = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start: float = time.perf_counter()
+        status: list[int] = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            if self.endpoints is None:
+                # the routes are all declared by the first request
+                self.endpoints = {route.path for route in scope["app"].routes}
+            path: str = scope["path"]
+            endpoint: str = path if path in self.endpoints else "other"
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start, endpoint, scope["method"]
+            )
+            REQUESTS.inc(endpoint, scope["method"], status[0])
@@ -0,0 +1,200 @@
+import argparse
+import datetime
+import time
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from api.clients import CLIENT_REGISTRY
+from api.db import parse_timestamp
+from api.schema import DB_NAME, COLLECTION_NAME, LATEST_COLLECTION_NAME, \
+    GEO_TIME_INDEX
+from api.topology import load_routers
+from api.zones import SHARD_KEY
+
+"""
+Converts string timestamps to BSON dates in place, with the API running.
+
+Documents with a string timestamp are read through a router in _id order, a
+batch at a time, and each is updated with its own _id, shard key and
+original string in the filter. mongos sends every update to the one shard
+that holds the document, and a report that changed in the meantime is left
+alone, so the run is safe next to live writes. Until it finishes, reads and
+the weather_latest timestamp guard handle both forms, and new reports are
+stored as dates (api.db.with_timestamp).
+
+Progress is saved after every batch in the migrations collection, so a run
+that is stopped carries on after the last _id it finished; --restart scans
+from the start again (e.g. after an API that still wrote strings was
+replaced). Strings that do not parse are counted and left as they are.
+
+The weather collection gets the geolocation and timestamp index
+(api.db.GEO_TIME_INDEX) first. With --drop-superseded, once both collections
+are converted, the separate geolocation and timestamp indexes it replaces
+are dropped.
+
+Run from the project root:
+    python -m api.migrate [--batch-size 1000] [--pause-ms 50]
+"""
+
+MIGRATIONS_COLLECTION: str = "migrations"
+MIGRATION_NAME: str = "timestamp_dates"
+
+INDEX_NOT_FOUND: int = 27
+
+# replaced by GEO_TIME_INDEX
+SUPERSEDED_INDEXES: tuple[str, ...] = ("geolocation_2dsphere", "timestamp_-1")
+
+
+class TimestampMigration:
+    collection: Collection
+    checkpoints: Collection
+    batch_size: int
+    pause: float
+
+    def __init__(
+            self, db: Database, collection: str, batch_size: int = 1000,
+            pause: float = 0.0
+    ):
+        self.collection = db.get_collection(collection)
+        self.checkpoints = db.get_collection(MIGRATIONS_COLLECTION)
+        self.checkpoint_id = f"{MIGRATION_NAME}:{collection}"
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def checkpoint(self) -> dict:
+        return self.checkpoints.find_one({"_id": self.checkpoint_id}) or {
+            "_id": self.checkpoint_id,
+            "lastId": None,
+            "converted": 0,
+            "invalid": 0,
+            "done": False,
+        }
+
+    def restart(self):
+        self.checkpoints.delete_one({"_id": self.checkpoint_id})
+
+    def _save(self, last_id, converted: int, invalid: int, done: bool):
+        self.checkpoints.update_one(
+            {"_id": self.checkpoint_id},
+            {
+                "$set": {
+                    "lastId": last_id,
+                    "done": done,
+                    "updated": datetime.datetime.utcnow(),
+                },
+                "$inc": {"converted": converted, "invalid": invalid},
+            },
+            upsert=True
+        )
+
+    def run_batch(self, last_id) -> tuple:
+        """Converts the next batch. Returns (last _id, documents read)."""
+        query: dict = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        # the _id index keeps every shard's scan in order, so the limit
+        # stops it early instead of sorting everything that matches
+        docs: list[dict] = list(
+            self.collection.find(query, {"timestamp": 1, SHARD_KEY: 1})
+            .sort("_id", 1)
+            .hint([("_id", 1)])
+            .limit(self.batch_size)
+        )
+        if not docs:
+            self._save(last_id, 0, 0, True)
+            return last_id, 0
+
+        ops: list[UpdateOne] = []
+        invalid: int = 0
+        for doc in docs:
+            try:
+                timestamp: datetime.datetime = parse_timestamp(
+                    doc["timestamp"]
+                )
+            except ValueError:
+                invalid += 1
+                continue
+            target: dict = {"_id": doc["_id"], "timestamp": doc["timestamp"]}
+            if SHARD_KEY in doc:
+                target[SHARD_KEY] = doc[SHARD_KEY]
+            ops.append(UpdateOne(target, {"$set": {"timestamp": timestamp}}))
+
+        converted: int = 0
+        if ops:
+            converted = self.collection.bulk_write(
+                ops, ordered=False
+            ).modified_count
+        last_id = docs[-1]["_id"]
+        self._save(last_id, converted, invalid, False)
+        return last_id, len(docs)
+
+    def run(self, progress_every: float = 5) -> dict:
+        checkpoint: dict = self.checkpoint()
+        if checkpoint["done"]:
+            # a finished run: scan again for strings written since
+            self.restart()
+            checkpoint = self.checkpoint()
+        last_id = checkpoint["lastId"]
+        start: float = time.perf_counter()
+        last_report: float = start
+        read: int = 0
+        while True:
+            last_id, count = self.run_batch(last_id)
+            if count == 0:
+                break
+            read += count
+            now: float = time.perf_counter()
+            if now - last_report >= progress_every:
+                last_report = now
+                print(f"  {self.collection.name}: {read} read, "
+                      f"{read / (now - start):.0f}/s")
+            if self.pause:
+                time.sleep(self.pause)
+        return self.checkpoint()
+
+
+def drop_superseded(coll: Collection) -> list[str]:
+    dropped: list[str] = []
+    for name in SUPERSEDED_INDEXES:
+        try:
+            coll.drop_index(name)
+            dropped.append(name)
+        except OperationFailure as err:
+            if err.code != INDEX_NOT_FOUND:
+                raise
+    return dropped
+
+
+def main(args: argparse.Namespace):
+    db: Database = CLIENT_REGISTRY.get_client(load_routers()[0])\
+        .get_database(DB_NAME)
+    weather: Collection = db.get_collection(COLLECTION_NAME)
+    print(f"Creating {GEO_TIME_INDEX} on {COLLECTION_NAME}...")
+    print(f"  Output: {weather.create_index(GEO_TIME_INDEX)}")
+
+    for name in (COLLECTION_NAME, LATEST_COLLECTION_NAME):
+        migration: TimestampMigration = TimestampMigration(
+            db, name, args.batch_size, args.pause_ms / 1000
+        )
+        if args.restart:
+            migration.restart()
+        print(f"Converting {name} timestamps...")
+        checkpoint: dict = migration.run()
+        print(f"  {checkpoint['converted']} converted, "
+              f"{checkpoint['invalid']} left as unparseable strings")
+
+    if args.drop_superseded:
+        print(f"Dropping {', '.join(drop_superseded(weather)) or 'nothing'}")
+    CLIENT_REGISTRY.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause-ms", type=float, default=50)
+    parser.add_argument("--restart", action="store_true")
+    parser.add_argument("--drop-superseded", action="store_true")
+    main(parser.parse_args())
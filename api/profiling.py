@@ -0,0 +1,345 @@
+import datetime
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from pymongo.monitoring import CommandListener
+
+from api.topology import RouterEndpoint
+
+"""
+Query plans and a slow query log for the weather lookups.
+
+Off by default. A profiled call records every driver command it sends
+(CommandCapture, a command listener on each client), and each of those
+commands is then re-run as an explain on a background thread, so the request
+itself only pays for copying its command documents. For every command the
+entry shows, per shard, the keys and documents examined, the winning plan
+(outermost stage first, with the index each scan used) and the time estimate
+of each execution stage. Entries go to a ring buffer, shown at
+/admin/queries, and calls over the slow threshold are also logged.
+
+Calls are picked for profiling when they are sampled (sample_rate) or once
+they turn out to be slow (slow_ms), so with a slow threshold every call's
+commands are captured. Cache hits never reach the database and are not
+profiled.
+"""
+
+LOGGER = logging.getLogger(__name__)
+
+EXPLAIN_VERBOSITY: str = "executionStats"
+EXPLAINED_COMMANDS: tuple[str, ...] = ("find", "aggregate", "count")
+
+# driver and session fields that explain does not accept in the command
+_SESSION_FIELDS: tuple[str, ...] = (
+    "lsid", "txnNumber", "readConcern", "maxTimeMS"
+)
+
+
+class _Capture(threading.local):
+    commands: list[dict] | None = None
+
+
+_CAPTURE: _Capture = _Capture()
+
+
+class CommandCapture(CommandListener):
+    """
+    Keeps the commands sent by the current thread while it is inside
+    QueryProfiler.run. Listeners are called on the thread that runs the
+    operation, so each call only sees its own commands.
+    """
+
+    def started(self, event):
+        commands: list[dict] | None = _CAPTURE.commands
+        if commands is not None:
+            commands.append({
+                "request_id": event.request_id,
+                "database": event.database_name,
+                "name": event.command_name,
+                "command": dict(event.command),
+                "ms": None,
+            })
+
+    def _finished(self, event):
+        commands: list[dict] | None = _CAPTURE.commands
+        if commands is None:
+            return
+        for command in reversed(commands):
+            if command["request_id"] == event.request_id:
+                command["ms"] = event.duration_micros / 1000
+                return
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+COMMAND_CAPTURE: CommandCapture = CommandCapture()
+
+
+def explain_command(command: dict) -> dict:
+    """The explain of a captured command, with its read preference."""
+    inner: dict = {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in _SESSION_FIELDS
+    }
+    explain: dict = {"explain": inner, "verbosity": EXPLAIN_VERBOSITY}
+    # mongos sends the explain to the same members as the original read
+    if "$readPreference" in command:
+        explain["$readPreference"] = command["$readPreference"]
+    return explain
+
+
+def _cursor_explain(output: dict) -> dict:
+    # a shard's part of an aggregate explain: the plan is either at the top
+    # or inside the first stage ($cursor, $geoNearCursor)
+    if "queryPlanner" in output:
+        return output
+    for stage in output.get("stages", []):
+        for value in stage.values():
+            if isinstance(value, dict) and "queryPlanner" in value:
+                return value
+    return {}
+
+
+def shard_explains(explain: dict) -> list[tuple[str, dict, dict]]:
+    """(shard name, winning plan, execution stats) per shard queried."""
+    if "shards" in explain:
+        # aggregate through mongos
+        found: list[tuple[str, dict, dict]] = []
+        for shard, output in explain["shards"].items():
+            cursor: dict = _cursor_explain(output)
+            found.append((
+                shard,
+                cursor.get("queryPlanner", {}).get("winningPlan", {}),
+                cursor.get("executionStats", {})
+            ))
+        return found
+
+    plan: dict = explain.get("queryPlanner", {}).get("winningPlan", {})
+    stats: dict = explain.get("executionStats", {})
+    if "shards" in plan:
+        # find through mongos: SINGLE_SHARD or SHARD_MERGE over the shards
+        shard_stats: dict[str, dict] = {
+            shard["shardName"]: shard
+            for shard in stats.get("executionStages", {}).get("shards", [])
+        }
+        return [
+            (
+                shard["shardName"], shard.get("winningPlan", {}),
+                shard_stats.get(shard["shardName"], {})
+            )
+            for shard in plan["shards"]
+        ]
+    # a plain mongod
+    return [("", plan, stats)]
+
+
+def _children(stage: dict) -> list[dict]:
+    if "inputStage" in stage:
+        return [stage["inputStage"]]
+    return stage.get("inputStages", [])
+
+
+def plan_stages(plan: dict) -> list[str]:
+    """The winning plan's stages, outermost first, e.g. FETCH, IXSCAN."""
+    # the slot based engine nests the classic plan under queryPlan
+    plan = plan.get("queryPlan", plan)
+    if "stage" not in plan:
+        return []
+    stage: str = plan["stage"]
+    if "indexName" in plan:
+        stage = f"{stage} {plan['indexName']}"
+    stages: list[str] = [stage]
+    for child in _children(plan):
+        stages.extend(plan_stages(child))
+    return stages
+
+
+def stage_timings(stage: dict) -> list[dict]:
+    """Per execution stage, outermost first: time estimate and counts."""
+    if "stage" not in stage:
+        return []
+    timings: list[dict] = [{
+        "stage": stage["stage"],
+        "ms": stage.get("executionTimeMillisEstimate"),
+        "returned": stage.get("nReturned"),
+        "keys_examined": stage.get("keysExamined"),
+        "docs_examined": stage.get("docsExamined"),
+    }]
+    for child in _children(stage):
+        timings.extend(stage_timings(child))
+    return timings
+
+
+def summarize_explain(explain: dict) -> list[dict]:
+    return [
+        {
+            "shard": shard,
+            "keys_examined": stats.get("totalKeysExamined"),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "returned": stats.get("nReturned"),
+            "ms": stats.get("executionTimeMillis"),
+            "plan": plan_stages(plan),
+            "stages": stage_timings(stats.get("executionStages", {})),
+        }
+        for shard, plan, stats in shard_explains(explain)
+    ]
+
+
+class QueryProfiler:
+    get_client: Callable[[RouterEndpoint], MongoClient]
+    sample_rate: float
+    slow_ms: float
+    max_pending: int
+    entries: deque
+    stats: dict[str, int]
+
+    def __init__(
+            self,
+            get_client: Callable[[RouterEndpoint], MongoClient],
+            sample_rate: float,
+            slow_ms: float,
+            log_size: int,
+            max_pending: int
+    ):
+        self.get_client = get_client
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.max_pending = max_pending
+        self.entries = deque(maxlen=log_size)
+        self.stats = {"profiled": 0, "slow": 0, "skipped": 0}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="api-explain"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def wrap(self, func: Callable) -> Callable:
+        """func(router, *args), profiled; unchanged when profiling is off."""
+        if not self.enabled:
+            return func
+
+        def profiled(router: RouterEndpoint, *args) -> Any:
+            return self.run(func, router, args)
+
+        return profiled
+
+    def run(self, func: Callable, router: RouterEndpoint, args: tuple) -> Any:
+        sampled: bool = self._rng.random() < self.sample_rate
+        commands: list[dict] = []
+        _CAPTURE.commands = commands
+        start: float = time.perf_counter()
+        try:
+            return func(router, *args)
+        finally:
+            elapsed_ms: float = 1000 * (time.perf_counter() - start)
+            _CAPTURE.commands = None
+            slow: bool = 0 < self.slow_ms <= elapsed_ms
+            if sampled or slow:
+                self._record(
+                    func.__name__, router, args, elapsed_ms, commands, slow
+                )
+
+    def _record(
+            self, name: str, router: RouterEndpoint, args: tuple,
+            elapsed_ms: float, commands: list[dict], slow: bool
+    ):
+        if slow:
+            LOGGER.warning(
+                "slow %s on %s: %.1f ms, %s", name, router.container_name,
+                elapsed_ms,
+                ", ".join(
+                    f"{command['name']} {command['ms'] or 0:.1f} ms"
+                    for command in commands
+                ) or "no commands"
+            )
+        entry: dict = {
+            "time": datetime.datetime.utcnow().isoformat(),
+            "reason": "slow" if slow else "sampled",
+            "call": name,
+            "router": router.container_name,
+            "args": list(args),
+            "elapsed_ms": elapsed_ms,
+            "commands": [
+                {
+                    "command": command["name"],
+                    "collection": command["command"].get(command["name"]),
+                    "ms": command["ms"],
+                }
+                for command in commands
+            ],
+        }
+        with self._lock:
+            self.stats["profiled"] += 1
+            self.stats["slow"] += slow
+            # explains queue behind each other; past the limit, keep the
+            # timings only rather than fall further behind
+            busy: bool = self._pending >= self.max_pending
+            if busy:
+                self.stats["skipped"] += 1
+            else:
+                self._pending += 1
+        if busy:
+            entry["explain_skipped"] = True
+            self._add(entry)
+            return
+        try:
+            self._executor.submit(self._explain, router, entry, commands)
+        except RuntimeError:
+            # shutting down: keep the timings
+            with self._lock:
+                self._pending -= 1
+            self._add(entry)
+
+    def _explain(
+            self, router: RouterEndpoint, entry: dict, commands: list[dict]
+    ):
+        try:
+            client: MongoClient = self.get_client(router)
+            for summary, command in zip(entry["commands"], commands):
+                if command["name"] not in EXPLAINED_COMMANDS:
+                    continue
+                try:
+                    explain: dict = client.get_database(
+                        command["database"]
+                    ).command(explain_command(command["command"]))
+                    summary["shards"] = summarize_explain(explain)
+                except PyMongoError as err:
+                    summary["error"] = str(err)
+            self._add(entry)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _add(self, entry: dict):
+        with self._lock:
+            self.entries.append(entry)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "slow_ms": self.slow_ms,
+                **self.stats,
+                "pending_explains": self._pending,
+                # newest first
+                "entries": list(reversed(self.entries)),
+            }
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,125 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING, GEOSPHERE
+
+from api.zones import SHARD_KEY
+
+"""
+The database layout shared by the API and the cluster tooling: database and
+collection names, and the indexes the API's queries need, each with the
+query it serves.
+
+Nothing here reads the API's configuration or connects to anything, so
+base/manifest.py can create the same indexes the API declares.
+"""
+
+DB_NAME: str = "env-canada"
+COLLECTION_NAME: str = "weather"
+LATEST_COLLECTION_NAME: str = "weather_latest"
+
+# nearest and newest from one index: $geoNear walks the geolocation key and
+# a timestamp condition in its query is checked on the same index entries
+GEO_TIME_INDEX: list[tuple[str, str | int]] = [
+    ("geolocation", GEOSPHERE), ("timestamp", DESCENDING)
+]
+
+
+def index_key(keys) -> tuple:
+    """An index key in a form that compares equal however it was read."""
+    # the server may report 1 as 1.0
+    return tuple(
+        (field, int(direction))
+        if isinstance(direction, (int, float)) else (field, direction)
+        for field, direction in keys
+    )
+
+
+class IndexSpec:
+    collection: str
+    keys: list[tuple[str, int | str]]
+    purpose: str
+    partial_filter: dict | None
+    expire_after_s: int | None
+    name: str
+
+    def __init__(
+            self,
+            collection: str,
+            keys: list[tuple[str, int | str]],
+            purpose: str,
+            partial_filter: dict | None = None,
+            expire_after_s: int | None = None,
+            name: str | None = None
+    ):
+        self.collection = collection
+        self.keys = keys
+        self.purpose = purpose
+        self.partial_filter = partial_filter
+        self.expire_after_s = expire_after_s
+        # the name the server gives an index by default
+        self.name = name or "_".join(
+            f"{field}_{direction}" for field, direction in keys
+        )
+
+    def options(self) -> dict:
+        options: dict = {}
+        if self.partial_filter is not None:
+            options["partialFilterExpression"] = self.partial_filter
+        if self.expire_after_s is not None:
+            options["expireAfterSeconds"] = self.expire_after_s
+        return options
+
+    def model(self) -> IndexModel:
+        return IndexModel(self.keys, name=self.name, **self.options())
+
+    def matches_key(self, key: dict) -> bool:
+        return index_key(key.items()) == index_key(self.keys)
+
+    def differences(self, spec: dict) -> list[str]:
+        """The options of an existing index that are not as declared."""
+        wanted: dict = self.options()
+        return [
+            option
+            for option in ("partialFilterExpression", "expireAfterSeconds")
+            if spec.get(option) != wanted.get(option)
+        ]
+
+
+SHARD_KEY_INDEX: IndexSpec = IndexSpec(
+    COLLECTION_NAME, [(SHARD_KEY, ASCENDING)],
+    "shard key; required to shard the collection (D04)"
+)
+
+
+def declared_indexes(retention_days: int = 0) -> list[IndexSpec]:
+    """
+    Every index the API needs, plus a TTL index on timestamp when reports
+    are only kept for retention_days.
+    """
+    indexes: list[IndexSpec] = [
+        SHARD_KEY_INDEX,
+        IndexSpec(
+            COLLECTION_NAME, GEO_TIME_INDEX,
+            "nearest_stations: $geoNear over the report history"
+        ),
+        IndexSpec(
+            COLLECTION_NAME, [("geolocation", ASCENDING), ("timestamp", -1)],
+            "latest_report: a station's newest report in one index seek"
+        ),
+        IndexSpec(
+            LATEST_COLLECTION_NAME, [("geolocation", GEOSPHERE)],
+            "nearest_latest: $geoNear over one document per station"
+        ),
+        IndexSpec(
+            LATEST_COLLECTION_NAME, [(SHARD_KEY, ASCENDING)],
+            "stations_in_range: stations in a longitude range"
+        ),
+    ]
+    if retention_days > 0:
+        indexes.append(IndexSpec(
+            COLLECTION_NAME, [("timestamp", ASCENDING)],
+            "retention: deletes reports older than "
+            "API_HISTORY_RETENTION_DAYS",
+            # string timestamps (before api.migrate) never expire
+            partial_filter={"timestamp": {"$type": "date"}},
+            expire_after_s=retention_days * 24 * 3600
+        ))
+    return indexes
@@ -0,0 +1,36 @@
+import threading
+from collections import Counter
+
+"""
+In-process counters for the API's own instrumentation.
+"""
+
+
+class FanoutStats:
+    """How many shard zones each weather lookup could be routed to."""
+    lookups: int
+    by_fanout: Counter
+    by_zone: Counter
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.by_fanout = Counter()
+        self.by_zone = Counter()
+
+    def record(self, zones: list[str]):
+        with self._lock:
+            self.lookups += 1
+            self.by_fanout[len(zones)] += 1
+            self.by_zone.update(zones)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "by_fanout": dict(self.by_fanout),
+                "by_zone": dict(self.by_zone),
+            }
+
+
+FANOUT_STATS: FanoutStats = FanoutStats()
@@ -0,0 +1,117 @@
+import json
+import os
+
+"""
+Where the API finds the mongos routers.
+
+The API only needs each router's name and address, so it reads them from
+configuration instead of importing the demo setup scripts (which create
+Docker networks and containers when imported). Sources, in order:
+- API_ROUTERS: comma separated name@host:port[/location] entries, e.g.
+  "tor@localhost:27021/toronto,win@localhost:27031/winnipeg"
+- API_TOPOLOGY_FILE: a JSON file like
+  {"routers": [{"name": "tor", "host": "localhost", "port": 27021,
+                "location": "toronto"}]}
+- otherwise the three routers created by demo/D00_init_server_setup.py
+"""
+
+TOPOLOGY_ENV: str = "API_ROUTERS"
+TOPOLOGY_FILE_ENV: str = "API_TOPOLOGY_FILE"
+
+
+class RouterEndpoint:
+    container_name: str
+    host: str
+    external_port: int
+    location: str | None
+
+    def __init__(
+            self,
+            container_name: str,
+            host: str,
+            external_port: int,
+            location: str | None = None
+    ):
+        self.container_name = container_name
+        self.host = host
+        self.external_port = external_port
+        self.location = location
+
+    def address(self) -> str:
+        return f"{self.host}:{self.external_port}"
+
+    def mongo_url(self) -> str:
+        return f"mongodb://{self.address()}"
+
+    def endpoints(self) -> list["RouterEndpoint"]:
+        """The routers a client for this endpoint talks to."""
+        return [self]
+
+
+class RouterSeedList(RouterEndpoint):
+    """
+    Every router behind one client. The driver monitors each mongos itself,
+    spreads operations over the ones within its latency window, and retries
+    a failed read or write once on another router.
+    """
+    routers: list[RouterEndpoint]
+
+    def __init__(self, routers: list[RouterEndpoint], name: str = "seed-list"):
+        super().__init__(name, routers[0].host, routers[0].external_port)
+        self.routers = routers
+
+    def endpoints(self) -> list[RouterEndpoint]:
+        return self.routers
+
+    def address(self) -> str:
+        # routers listed more than once are only seeded once
+        return ",".join(dict.fromkeys(
+            router.address() for router in self.routers
+        ))
+
+
+DEFAULT_ROUTERS: list[RouterEndpoint] = [
+    RouterEndpoint("dc-TORONTO_type-ROUTER_dcid-0", "localhost", 27021,
+                   "toronto"),
+    RouterEndpoint("dc-WINNIPEG_type-ROUTER_dcid-1", "localhost", 27031,
+                   "winnipeg"),
+    RouterEndpoint("dc-MONTREAL_type-ROUTER_dcid-2", "localhost", 27041,
+                   "montreal"),
+]
+
+
+def parse_routers(spec: str) -> list[RouterEndpoint]:
+    routers: list[RouterEndpoint] = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, address = entry.partition("@")
+        address, _, location = address.partition("/")
+        host, _, port = address.rpartition(":")
+        if not name or not host or not port.isdigit():
+            raise ValueError(f"Invalid router entry: {entry}")
+        routers.append(
+            RouterEndpoint(name, host, int(port), location or None)
+        )
+    return routers
+
+
+def read_topology_file(path: str) -> list[RouterEndpoint]:
+    with open(path) as file:
+        topology: dict = json.load(file)
+    return [
+        RouterEndpoint(
+            router["name"], router["host"], int(router["port"]),
+            router.get("location")
+        )
+        for router in topology["routers"]
+    ]
+
+
+def load_routers() -> list[RouterEndpoint]:
+    if os.environ.get(TOPOLOGY_ENV):
+        return parse_routers(os.environ[TOPOLOGY_ENV])
+    if os.environ.get(TOPOLOGY_FILE_ENV):
+        return read_topology_file(os.environ[TOPOLOGY_FILE_ENV])
+    return list(DEFAULT_ROUTERS)
@@ -0,0 +1,97 @@
+import math
+
+"""
+The stationLongitude zone layout from demo/D04_scaling_collection_setup.py.
+
+A query that carries a stationLongitude range is only routed by mongos to the
+shards whose zones overlap that range, so the read path turns its search
+radius into a longitude range and uses the zones to report the fan-out.
+"""
+
+SHARD_KEY: str = "stationLongitude"
+
+TBAY_LON: float = -89.3
+OTT_LON: float = -75.7
+
+# (zone, min longitude incl., max longitude excl.)
+ZONE_RANGES: list[tuple[str, float, float]] = [
+    ("MANITOBA", -math.inf, TBAY_LON),
+    ("ONTARIO", TBAY_LON, OTT_LON),
+    ("QUEBEC", OTT_LON, math.inf),
+]
+
+# the radius MongoDB uses for spherical geometry ($geoNear, $centerSphere)
+EARTH_RADIUS_M: float = 6378100
+
+
+def longitude_range(
+        lon: float, lat: float, radius_m: float
+) -> tuple[float, float]:
+    """Smallest longitude range holding every point within radius_m."""
+    angular: float = radius_m / EARTH_RADIUS_M
+    if angular >= math.pi / 2 \
+            or abs(lat) + math.degrees(angular) >= 90:
+        # the search circle reaches a pole
+        return -180.0, 180.0
+
+    delta: float = math.degrees(
+        math.asin(math.sin(angular) / math.cos(math.radians(lat)))
+    )
+    if lon - delta < -180 or lon + delta > 180:
+        # the search circle wraps around the antimeridian
+        return -180.0, 180.0
+    return lon - delta, lon + delta
+
+
+def latitude_range(lat: float, radius_m: float) -> tuple[float, float]:
+    """Smallest latitude range holding every point within radius_m."""
+    delta: float = math.degrees(radius_m / EARTH_RADIUS_M)
+    return max(lat - delta, -90.0), min(lat + delta, 90.0)
+
+
+def zone_for_longitude(lon: float) -> str:
+    for zone, zone_min, zone_max in ZONE_RANGES:
+        if zone_min <= lon < zone_max:
+            return zone
+    return ZONE_RANGES[-1][0]
+
+
+def zones_for_range(lon_min: float, lon_max: float) -> list[str]:
+    return [
+        zone
+        for zone, zone_min, zone_max in ZONE_RANGES
+        if zone_min <= lon_max and lon_min < zone_max
+    ]
+
+
+def distance_m(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Great circle (haversine) distance, matching $geoNear's spherical."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi: float = phi2 - phi1
+    d_lambda: float = math.radians(lon2 - lon1)
+    a: float = math.sin(d_phi / 2) ** 2 \
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def group_by_zone(
+        points: list[tuple[float, float]]
+) -> dict[str, list[int]]:
+    """Indexes of the (lon, lat) points, grouped by the zone they fall in."""
+    groups: dict[str, list[int]] = {}
+    for idx, (lon, _) in enumerate(points):
+        groups.setdefault(zone_for_longitude(lon), []).append(idx)
+    return groups
+
+
+def group_by_cell(
+        points: list[tuple[float, float]], cell_degrees: float
+) -> dict[tuple[int, int], list[int]]:
+    """Indexes of the (lon, lat) points, grouped by grid cell."""
+    groups: dict[tuple[int, int], list[int]] = {}
+    for idx, (lon, lat) in enumerate(points):
+        groups.setdefault(
+            (math.floor(lon / cell_degrees), math.floor(lat / cell_degrees)),
+            []
+        ).append(idx)
+    return groups
@@ -1,7 +1,6 @@
-import time
-
 from base.db_physical import MongoConfigServer, MongoShardServer, DataCentre, \
     BaseMongoServer
+from base.readiness import READY, PRIMARY, wait_until_all, wait_until_any
 
 
 class ConfigServerReplicaSet:
@@ -13,16 +12,28 @@ class ConfigServerReplicaSet:
         self.replica_set_name = replica_set_name
 
     def wait_until_healthy(self):
-        servers: list[BaseMongoServer] = self.get_servers()
-        for server in servers:
-            while not server.healthy():
-                time.sleep(1)
+        self.wait_until(READY)
+
+    def wait_until(self, state: str, timeout: float | None = None) -> bool:
+        return wait_until_all(
+            [server.readiness() for server in self.get_servers()],
+            state, timeout
+        )
+
+    def wait_for_primary(self, timeout: float | None = None) -> bool:
+        return wait_until_any(
+            [server.readiness() for server in self.get_servers()],
+            PRIMARY, timeout
+        )
 
     def add_server(
-            self, dc: DataCentre, pref_primary: bool = False
+            self, dc: DataCentre, pref_primary: bool = False,
+            provision: bool = True, priority: float | None = None,
+            votes: int = 1
     ) -> MongoConfigServer:
         server: MongoConfigServer = dc.add_config_server(
-            replica_set_name=self.replica_set_name
+            replica_set_name=self.replica_set_name, provision=provision,
+            priority=priority, votes=votes
         )
 
         self.config_servers.append(server)
@@ -34,6 +45,17 @@ class ConfigServerReplicaSet:
     def get_servers(self) -> list[BaseMongoServer]:
         return self.config_servers
 
+    def reconfigure(self) -> dict | None:
+        """
+        Brings the member tags, priorities and votes of a running replica
+        set in line with its servers (e.g. one initiated before members
+        were tagged). Returns None if they already are.
+        """
+        for server in self.get_servers():
+            if server.is_primary():
+                return server.reconfigure_members(self.get_servers())
+        raise RuntimeError(f"{self.replica_set_name} has no primary")
+
     def initiate_replica_set(self) -> dict:
         return self.pref_primary.initiate_replica_set(
             members=[
@@ -53,16 +75,28 @@ class ShardServerReplicaSet:
         self.shard_servers = []
 
     def wait_until_healthy(self):
-        servers: list[BaseMongoServer] = self.get_servers()
-        for server in servers:
-            while not server.healthy():
-                time.sleep(1)
+        self.wait_until(READY)
+
+    def wait_until(self, state: str, timeout: float | None = None) -> bool:
+        return wait_until_all(
+            [server.readiness() for server in self.get_servers()],
+            state, timeout
+        )
+
+    def wait_for_primary(self, timeout: float | None = None) -> bool:
+        return wait_until_any(
+            [server.readiness() for server in self.get_servers()],
+            PRIMARY, timeout
+        )
 
     def add_server(
-            self, dc: DataCentre, pref_primary: bool = False
+            self, dc: DataCentre, pref_primary: bool = False,
+            provision: bool = True, priority: float | None = None,
+            votes: int = 1
     ) -> MongoShardServer:
         server: MongoShardServer = dc.add_shard_server(
-            replica_set_name=self.replica_set_name
+            replica_set_name=self.replica_set_name, provision=provision,
+            priority=priority, votes=votes
         )
 
         self.shard_servers.append(server)
@@ -74,6 +108,17 @@ class ShardServerReplicaSet:
     def get_servers(self) -> list[BaseMongoServer]:
         return self.shard_servers
 
+    def reconfigure(self) -> dict | None:
+        """
+        Brings the member tags, priorities and votes of a running replica
+        set in line with its servers (e.g. one initiated before members
+        were tagged). Returns None if they already are.
+        """
+        for server in self.get_servers():
+            if server.is_primary():
+                return server.reconfigure_members(self.get_servers())
+        raise RuntimeError(f"{self.replica_set_name} has no primary")
+
     def initiate_replica_set(self) -> dict:
         data: dict = self.pref_primary.initiate_replica_set(
             members=[
@@ -81,4 +126,4 @@ class ShardServerReplicaSet:
                 if node.container_name != self.pref_primary.container_name
             ]
         )
-
+        return data
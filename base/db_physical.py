@@ -1,11 +1,18 @@
+import time
+
 import pymongo
 from docker.errors import NotFound
 from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError, NetworkTimeout
+from pymongo.errors import ServerSelectionTimeoutError, NetworkTimeout, \
+    PyMongoError
 
 from base.docker_init import DOCKER_CLIENT, DOCKER_NETWORK
+from base.readiness import READINESS, ServerWatch, wait_until_all
 from docker.models.containers import Container
 
+# replica set member tag holding the member's data centre (DataCentre.location)
+DC_TAG: str = "dc"
+
 
 class BaseMongoServer:
     image: str = "mongo"
@@ -21,21 +28,38 @@ class BaseMongoServer:
 
     container: Container
 
+    # replica set membership: the data centre is sent as the "dc" member tag
+    data_centre: str | None
+    priority: float | None
+    votes: int
+
     def __init__(
             self,
             container_name: str,
             external_port: int,
             has_data_volume: bool,
-            container_commands: list[tuple[str, str]]
+            container_commands: list[tuple[str, str]],
+            provision: bool = True,
+            data_centre: str | None = None,
+            priority: float | None = None,
+            votes: int = 1
     ):
         self.container_name = container_name
         self.external_port = external_port
         self.has_data_volume = has_data_volume
+        self.data_centre = data_centre
+        self.priority = priority
+        self.votes = votes
         if has_data_volume:
             self.data_volume_name = container_name
 
         self.container_commands = container_commands
 
+        if provision:
+            self.provision()
+
+    def provision(self):
+        """Gets or creates the server's container and starts it."""
         try:
             self.container = DOCKER_CLIENT.containers.get(self.container_name)
         except NotFound:
@@ -99,6 +123,131 @@ class BaseMongoServer:
 
         return container_healthy and mongo_healthy
 
+    def readiness(self) -> ServerWatch:
+        return READINESS.watch(self.container_name, self.external_port)
+
+    def wait_until(self, state: str, timeout: float | None = None) -> bool:
+        """
+        Blocks until the server reaches a base.readiness state (e.g. READY,
+        DOWN, PRIMARY). Returns False if the timeout passes first.
+        """
+        return wait_until_all([self.readiness()], state, timeout)
+
+    def is_primary(self) -> bool:
+        conn = self.connect()
+        try:
+            with pymongo.timeout(2):
+                hello: dict = conn.admin.command("hello")
+                return hello.get("isWritablePrimary", False)
+        except PyMongoError:
+            return False
+        finally:
+            conn.close()
+
+    def caught_up(self) -> bool:
+        """Whether the server has applied every write its primary has."""
+        conn = self.connect()
+        try:
+            with pymongo.timeout(2):
+                status: dict = conn.admin.command("replSetGetStatus")
+        except PyMongoError:
+            return False
+        finally:
+            conn.close()
+        own: dict = next(
+            member for member in status["members"] if member.get("self")
+        )
+        primary: dict | None = next(
+            (
+                member for member in status["members"]
+                if member["stateStr"] == "PRIMARY"
+            ),
+            None
+        )
+        return primary is not None and own["optime"] == primary["optime"]
+
+    def wait_for_catch_up(self, timeout: float, poll_s: float = 1) -> bool:
+        """
+        Blocks until caught_up(). No event reports optimes, so this polls.
+        Returns False if the timeout passes first.
+        """
+        deadline: float = time.monotonic() + timeout
+        while not self.caught_up():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_s)
+        return True
+
+    def member_config(self, member_id: int, default_priority: float) -> dict:
+        """The server's entry in a replica set configuration."""
+        member: dict = {
+            "_id": member_id,
+            "host": self.container_name,
+            "priority": self.priority
+            if self.priority is not None else default_priority,
+            "votes": self.votes,
+        }
+        if self.data_centre is not None:
+            member["tags"] = {DC_TAG: self.data_centre}
+        return member
+
+    @staticmethod
+    def _update_members(
+            config: dict, members: list["BaseMongoServer"]
+    ) -> bool:
+        """
+        Sets the tags, priorities and votes of members in a replica set
+        configuration. Returns whether anything changed.
+        """
+        by_host: dict[str, BaseMongoServer] = {
+            member.container_name: member for member in members
+        }
+        changed: bool = False
+        for member in config["members"]:
+            server: BaseMongoServer | None = by_host.get(
+                member["host"].split(":")[0]
+            )
+            if server is None:
+                continue
+            for key, value in server.member_config(
+                    member["_id"], member["priority"]
+            ).items():
+                if key not in ("_id", "host") and member.get(key) != value:
+                    member[key] = value
+                    changed = True
+        return changed
+
+    def members_configured(self, members: list["BaseMongoServer"]) -> bool:
+        """
+        Whether the running replica set already has the tags, priorities
+        and votes of members. Any member can answer.
+        """
+        conn = self.connect()
+        try:
+            with pymongo.timeout(2):
+                config: dict = conn.admin.command("replSetGetConfig")["config"]
+            return not self._update_members(config, members)
+        finally:
+            conn.close()
+
+    def reconfigure_members(
+            self, members: list["BaseMongoServer"]
+    ) -> dict | None:
+        """
+        Applies the tags, priorities and votes of members to a replica set
+        that is already running. Must be called on its primary. Returns None
+        if the configuration already matches.
+        """
+        conn = self.connect()
+        try:
+            config: dict = conn.admin.command("replSetGetConfig")["config"]
+            if not self._update_members(config, members):
+                return None
+            config["version"] += 1
+            return conn.admin.command("replSetReconfig", config)
+        finally:
+            conn.close()
+
     def connect(self, direct: bool = True) -> MongoClient:
         return MongoClient(
             "localhost",
@@ -114,7 +263,11 @@ class MongoShardServer(BaseMongoServer):
             self,
             name: str,
             port: int,
-            replica_set_name: str
+            replica_set_name: str,
+            provision: bool = True,
+            data_centre: str | None = None,
+            priority: float | None = None,
+            votes: int = 1
     ):
         super().__init__(
             container_name=name,
@@ -126,7 +279,11 @@ class MongoShardServer(BaseMongoServer):
                 ("--replSet", replica_set_name),
                 ("--dbpath", self.internal_datapath),
                 ("--port", self.internal_port),
-            ]
+            ],
+            provision=provision,
+            data_centre=data_centre,
+            priority=priority,
+            votes=votes
         )
         self.replica_set_name = replica_set_name
 
@@ -136,11 +293,7 @@ class MongoShardServer(BaseMongoServer):
         arg: dict = {
             "_id": self.replica_set_name,
             "members": [
-                {
-                    "_id": idx,
-                    "host": member.container_name,
-                    "priority": 1 if idx == 0 else 0.5
-                }
+                member.member_config(idx, 1 if idx == 0 else 0.5)
                 for idx, member in enumerate(members)
             ]
         }
@@ -158,7 +311,11 @@ class MongoConfigServer(BaseMongoServer):
             self,
             name: str,
             port: int,
-            replica_set_name: str
+            replica_set_name: str,
+            provision: bool = True,
+            data_centre: str | None = None,
+            priority: float | None = None,
+            votes: int = 1
     ):
         super().__init__(
             container_name=name,
@@ -170,7 +327,11 @@ class MongoConfigServer(BaseMongoServer):
                 ("--replSet", replica_set_name),
                 ("--dbpath", self.internal_datapath),
                 ("--port", self.internal_port),
-            ]
+            ],
+            provision=provision,
+            data_centre=data_centre,
+            priority=priority,
+            votes=votes
         )
         self.replica_set_name = replica_set_name
 
@@ -181,11 +342,7 @@ class MongoConfigServer(BaseMongoServer):
             "_id": self.replica_set_name,
             'configsvr': True,
             "members": [
-                {
-                    "_id": idx,
-                    "host": member.container_name,
-                    "priority": 1 if idx == 0 else 0.5
-                }
+                member.member_config(idx, 1 if idx == 0 else 0.5)
                 for idx, member in enumerate(members)
             ]
         }
@@ -200,7 +357,8 @@ class MongoRouter(BaseMongoServer):
             self,
             name: str,
             port: int,
-            config_servers: list[MongoConfigServer]
+            config_servers: list[MongoConfigServer],
+            provision: bool = True
     ):
         super().__init__(
             container_name=name,
@@ -215,7 +373,8 @@ class MongoRouter(BaseMongoServer):
                 ),
                 ("--port", self.internal_port),
                 ("--bind_ip_all", "")
-            ]
+            ],
+            provision=provision
         )
 
     def add_shard(self, shard_server: MongoShardServer) -> dict:
@@ -262,7 +421,8 @@ class DataCentre:
         return port
 
     def add_router(
-            self, config_servers: list[MongoConfigServer]
+            self, config_servers: list[MongoConfigServer],
+            provision: bool = True
     ) -> MongoRouter:
         dc: str = self.location.upper()
         stype: str = "ROUTER"
@@ -272,13 +432,15 @@ class DataCentre:
         port: int = self._get_next_port()
 
         router: MongoRouter = MongoRouter(
-            name=name, port=port, config_servers=config_servers
+            name=name, port=port, config_servers=config_servers,
+            provision=provision
         )
         self.routers.append(router)
         return router
 
     def add_config_server(
-            self, replica_set_name: str
+            self, replica_set_name: str, provision: bool = True,
+            priority: float | None = None, votes: int = 1
     ) -> MongoConfigServer:
         dc: str = self.location.upper()
         repl_set: str = replica_set_name.upper()
@@ -289,13 +451,16 @@ class DataCentre:
         port: int = self._get_next_port()
 
         config_server: MongoConfigServer = MongoConfigServer(
-            name=name, port=port, replica_set_name=replica_set_name
+            name=name, port=port, replica_set_name=replica_set_name,
+            provision=provision, data_centre=self.location,
+            priority=priority, votes=votes
         )
         self.config_servers.append(config_server)
         return config_server
 
     def add_shard_server(
-            self, replica_set_name: str
+            self, replica_set_name: str, provision: bool = True,
+            priority: float | None = None, votes: int = 1
     ) -> MongoShardServer:
         dc: str = self.location.upper()
         repl_set: str = replica_set_name.upper()
@@ -306,7 +471,9 @@ class DataCentre:
         port: int = self._get_next_port()
 
         shard_server: MongoShardServer = MongoShardServer(
-            name=name, port=port, replica_set_name=replica_set_name
+            name=name, port=port, replica_set_name=replica_set_name,
+            provision=provision, data_centre=self.location,
+            priority=priority, votes=votes
         )
 
         self.shard_servers.append(shard_server)
@@ -0,0 +1,457 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import pymongo
+from bson import MinKey, MaxKey
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+from api.schema import IndexSpec, declared_indexes, index_key
+from base.db_logical import ConfigServerReplicaSet, ShardServerReplicaSet
+from base.db_physical import DataCentre, MongoRouter, BaseMongoServer
+from base.docker_init import DOCKER_CLIENT
+from base.readiness import READY
+
+"""
+Declarative cluster topology with incremental reconcile.
+
+A manifest (see demo/cluster.json) describes the data centres, the config
+and shard replica sets (members may set a priority and votes), the routers,
+and the sharded collections with their zones. The indexes are the ones the
+API declares in api/schema.py, so they are not repeated here (the retention
+TTL index follows the API's configuration and is left to api.indexes).
+ClusterReconciler declares the matching DataCentre, replica set and router
+objects without touching Docker, reads the live cluster, and plans only the
+steps that are missing:
+- containers that do not exist or are not running
+- replica sets that were never initiated, or whose members' tags,
+  priorities and votes differ from the manifest
+- shards the cluster does not know about
+- collections that are not sharded, zones and zone ranges that are not set,
+  and indexes that do not exist
+
+Steps run phase by phase, with everything inside a phase in parallel.
+Reading the live state is one Docker call plus a handful of Mongo commands,
+also in parallel, so re-applying a manifest that is already in place finds
+nothing to do in well under a second.
+
+Run from the project root:
+    python -m base.manifest demo/cluster.json [--dry-run]
+"""
+
+PHASES: list[str] = [
+    "create containers",
+    "wait for servers",
+    "initiate replica sets",
+    "wait for primaries",
+    "reconfigure replica sets",
+    "wait for routers",
+    "add shards",
+    # shardCollection on a collection that holds data needs the shard key
+    # index to exist already
+    "create indexes",
+    "shard collections",
+    "add zones",
+    "zone ranges",
+]
+
+NOT_YET_INITIALIZED: int = 94
+
+# live state checks must not hang on a server that is down
+CHECK_TIMEOUT_S: float = 2
+
+
+class Step:
+    phase: str
+    description: str
+    action: Callable
+
+    def __init__(self, phase: str, description: str, action: Callable):
+        self.phase = phase
+        self.description = description
+        self.action = action
+
+
+def _bound(value: float | None, missing) -> object:
+    return missing if value is None else value
+
+
+class ClusterReconciler:
+    manifest: dict
+    data_centres: dict[str, DataCentre]
+    config_replica_set: ConfigServerReplicaSet
+    shard_replica_sets: list[ShardServerReplicaSet]
+    routers: list[MongoRouter]
+    indexes: list[IndexSpec]
+    timings: dict[str, float]
+
+    def __init__(self, manifest: dict, timeout: float = 300):
+        self.manifest = manifest
+        self.timeout = timeout
+        self.indexes = declared_indexes()
+        self.timings = {}
+        self._declare()
+
+    def _declare(self):
+        # declaration order fixes container names and ports, and matches the
+        # order of demo/D00_init_server_setup.py then D03
+        self.data_centres = {
+            dc["location"]: DataCentre(
+                location=dc["location"], start_port=dc["start_port"]
+            )
+            for dc in self.manifest["data_centres"]
+        }
+
+        cfg: dict = self.manifest["config_replica_set"]
+        self.config_replica_set = ConfigServerReplicaSet(
+            replica_set_name=cfg["name"]
+        )
+        for member in cfg["members"]:
+            self.config_replica_set.add_server(
+                self.data_centres[member["dc"]],
+                pref_primary=member.get("primary", False),
+                provision=False,
+                priority=member.get("priority"),
+                votes=member.get("votes", 1)
+            )
+
+        self.routers = [
+            self.data_centres[location].add_router(
+                config_servers=self.config_replica_set.config_servers,
+                provision=False
+            )
+            for location in self.manifest["routers"]
+        ]
+
+        self.shard_replica_sets = []
+        for shard in self.manifest["shard_replica_sets"]:
+            replica_set = ShardServerReplicaSet(replica_set_name=shard["name"])
+            for member in shard["members"]:
+                replica_set.add_server(
+                    dc=self.data_centres[member["dc"]],
+                    pref_primary=member.get("primary", False),
+                    provision=False,
+                    priority=member.get("priority"),
+                    votes=member.get("votes", 1)
+                )
+            self.shard_replica_sets.append(replica_set)
+
+    def _replica_sets(self) -> list:
+        return [self.config_replica_set, *self.shard_replica_sets]
+
+    # live state
+
+    @staticmethod
+    def _initiated(replica_set) -> bool:
+        conn: MongoClient = replica_set.pref_primary.connect()
+        try:
+            with pymongo.timeout(CHECK_TIMEOUT_S):
+                conn.admin.command("replSetGetStatus")
+            return True
+        except OperationFailure as err:
+            if err.code == NOT_YET_INITIALIZED:
+                return False
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _configured(replica_set) -> bool:
+        with pymongo.timeout(CHECK_TIMEOUT_S):
+            return replica_set.pref_primary.members_configured(
+                replica_set.get_servers()
+            )
+
+    def _cluster_state(self, router: MongoRouter) -> dict:
+        conn: MongoClient = router.connect(direct=False)
+        try:
+            with pymongo.timeout(CHECK_TIMEOUT_S):
+                config = conn.get_database("config")
+                db = conn.get_database(self.manifest["database"])
+                return {
+                    "shards": {
+                        shard["_id"]: set(shard.get("tags", []))
+                        for shard in config.shards.find()
+                    },
+                    "sharded": {
+                        coll["_id"]: coll["key"]
+                        for coll in config.collections.find(
+                            {"dropped": {"$ne": True}}
+                        )
+                    },
+                    "ranges": {
+                        (tag["ns"], tag["tag"], str(tag["min"]),
+                         str(tag["max"]))
+                        for tag in config.tags.find()
+                    },
+                    "indexes": {
+                        name: {
+                            index_key(index["key"])
+                            for index in db.get_collection(name)
+                            .index_information().values()
+                        }
+                        for name in {
+                            spec.collection for spec in self.indexes
+                        }
+                    },
+                }
+        finally:
+            conn.close()
+
+    def read_state(self) -> dict:
+        with ThreadPoolExecutor(
+                max_workers=len(self._replica_sets()) + 1
+        ) as executor:
+            containers = executor.submit(
+                lambda: {
+                    container.name: container.status
+                    for container in DOCKER_CLIENT.containers.list(all=True)
+                }
+            )
+            initiated = {
+                replica_set.replica_set_name: executor.submit(
+                    self._initiated, replica_set
+                )
+                for replica_set in self._replica_sets()
+            }
+            configured = {
+                replica_set.replica_set_name: executor.submit(
+                    self._configured, replica_set
+                )
+                for replica_set in self._replica_sets()
+            }
+            cluster = executor.submit(self._cluster_state, self.routers[0])
+
+            state: dict = {"containers": containers.result()}
+            state["initiated"] = {}
+            for name, future in initiated.items():
+                try:
+                    state["initiated"][name] = future.result()
+                except PyMongoError:
+                    # not reachable yet: it will be created or started first
+                    state["initiated"][name] = False
+            state["configured"] = {}
+            for name, future in configured.items():
+                try:
+                    state["configured"][name] = future.result()
+                except PyMongoError:
+                    # not initiated or not reachable: initiating it applies
+                    # the manifest's member settings
+                    state["configured"][name] = True
+            try:
+                state["cluster"] = cluster.result()
+            except PyMongoError:
+                state["cluster"] = None
+        return state
+
+    # planning
+
+    def plan(self, state: dict | None = None) -> list[Step]:
+        if state is None:
+            state = self.read_state()
+        containers: dict[str, str] = state["containers"]
+        steps: list[Step] = []
+
+        def need_server(server: BaseMongoServer):
+            if containers.get(server.container_name) != "running":
+                steps.append(Step(
+                    "create containers", server.container_name,
+                    server.provision
+                ))
+                phase: str = "wait for routers" \
+                    if isinstance(server, MongoRouter) else "wait for servers"
+                steps.append(Step(
+                    phase, server.container_name,
+                    lambda: self._wait_until_ready(server)
+                ))
+
+        for replica_set in self._replica_sets():
+            for server in replica_set.get_servers():
+                need_server(server)
+            if not state["initiated"][replica_set.replica_set_name]:
+                steps.append(Step(
+                    "initiate replica sets", replica_set.replica_set_name,
+                    lambda rs=replica_set: self._initiate(rs)
+                ))
+                steps.append(Step(
+                    "wait for primaries", replica_set.replica_set_name,
+                    lambda rs=replica_set: self._wait_for_primary(rs)
+                ))
+            elif not state["configured"][replica_set.replica_set_name]:
+                steps.append(Step(
+                    "reconfigure replica sets", replica_set.replica_set_name,
+                    lambda rs=replica_set: self._reconfigure(rs)
+                ))
+        for router in self.routers:
+            need_server(router)
+
+        steps.extend(self._plan_cluster(state["cluster"]))
+        return steps
+
+    def _plan_cluster(self, cluster: dict | None) -> list[Step]:
+        # with no router to ask, plan every step; each one is idempotent
+        shards: dict = cluster["shards"] if cluster else {}
+        sharded: dict = cluster["sharded"] if cluster else {}
+        ranges: set = cluster["ranges"] if cluster else set()
+        indexes: dict = cluster["indexes"] if cluster else {}
+
+        router: MongoRouter = self.routers[0]
+        db_name: str = self.manifest["database"]
+        steps: list[Step] = []
+        zoned: set[tuple[str, str]] = set()
+
+        for replica_set in self.shard_replica_sets:
+            if replica_set.replica_set_name not in shards:
+                steps.append(Step(
+                    "add shards", replica_set.replica_set_name,
+                    lambda rs=replica_set: self._add_shard(rs)
+                ))
+
+        for coll in self.manifest["collections"]:
+            ns: str = f"{db_name}.{coll['name']}"
+            shard_key: dict | None = coll.get("shard_key")
+            if shard_key and sharded.get(ns) != shard_key:
+                steps.append(Step(
+                    "shard collections", ns,
+                    lambda ns=ns, key=shard_key: self._command(
+                        router, {"shardCollection": ns, "key": key}
+                    )
+                ))
+
+            for zone in coll.get("zones", []):
+                # zones are named after the shard that holds them unless the
+                # manifest says otherwise
+                shard: str = zone.get("shard", zone["zone"])
+                if zone["zone"] not in shards.get(shard, set()) \
+                        and (shard, zone["zone"]) not in zoned:
+                    zoned.add((shard, zone["zone"]))
+                    steps.append(Step(
+                        "add zones", f"{shard} {zone['zone']}",
+                        lambda shard=shard, zone=zone["zone"]: self._command(
+                            router, {"addShardToZone": shard, "zone": zone}
+                        )
+                    ))
+
+                field: str = next(iter(shard_key))
+                bounds: tuple = (
+                    {field: _bound(zone["min"], MinKey())},
+                    {field: _bound(zone["max"], MaxKey())},
+                )
+                if (ns, zone["zone"], str(bounds[0]), str(bounds[1])) \
+                        not in ranges:
+                    steps.append(Step(
+                        "zone ranges", f"{ns} {zone['zone']}",
+                        lambda ns=ns, zone=zone["zone"], bounds=bounds:
+                        self._command(router, {
+                            "updateZoneKeyRange": ns,
+                            "min": bounds[0],
+                            "max": bounds[1],
+                            "zone": zone
+                        })
+                    ))
+
+        for spec in self.indexes:
+            if index_key(spec.keys) not in indexes.get(spec.collection, set()):
+                steps.append(Step(
+                    "create indexes", f"{db_name}.{spec.collection} "
+                    f"{spec.name}",
+                    lambda spec=spec: self._create_index(router, spec)
+                ))
+        return steps
+
+    # actions
+
+    def _wait_until_ready(self, server: BaseMongoServer):
+        if not server.wait_until(READY, self.timeout):
+            raise TimeoutError(
+                f"Timed out waiting for {server.container_name}"
+            )
+
+    @staticmethod
+    def _initiate(replica_set) -> dict | None:
+        try:
+            return replica_set.initiate_replica_set()
+        except OperationFailure:
+            # initiated since the state was read
+            return None
+
+    def _wait_for_primary(self, replica_set):
+        if not replica_set.wait_for_primary(self.timeout):
+            raise TimeoutError(
+                f"Timed out waiting for a {replica_set.replica_set_name} "
+                f"primary"
+            )
+
+    def _reconfigure(self, replica_set) -> dict | None:
+        # replSetReconfig has to run on the primary
+        self._wait_for_primary(replica_set)
+        return replica_set.reconfigure()
+
+    def _add_shard(self, replica_set: ShardServerReplicaSet) -> dict | None:
+        router: MongoRouter = self.routers[0]
+        if router.has_shard(replica_set.pref_primary):
+            return None
+        return router.add_shard(replica_set.pref_primary)
+
+    @staticmethod
+    def _command(router: MongoRouter, command: dict) -> dict:
+        conn: MongoClient = router.connect(direct=False)
+        try:
+            return conn.admin.command(command)
+        finally:
+            conn.close()
+
+    def _create_index(self, router: MongoRouter, spec: IndexSpec) -> list:
+        conn: MongoClient = router.connect(direct=False)
+        try:
+            return conn.get_database(self.manifest["database"])\
+                .get_collection(spec.collection)\
+                .create_indexes([spec.model()])
+        finally:
+            conn.close()
+
+    def apply(self, steps: list[Step]) -> dict[str, float]:
+        start: float = time.perf_counter()
+        for phase in PHASES:
+            phase_steps: list[Step] = [
+                step for step in steps if step.phase == phase
+            ]
+            if not phase_steps:
+                continue
+            print(f"  {phase} ({len(phase_steps)})...")
+            phase_start: float = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(phase_steps)) as executor:
+                # list() re-raises the first failure
+                list(executor.map(lambda step: step.action(), phase_steps))
+            self.timings[phase] = time.perf_counter() - phase_start
+        self.timings["total"] = time.perf_counter() - start
+        return self.timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("manifest")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.manifest) as file:
+        reconciler = ClusterReconciler(json.load(file))
+
+    print("Reading live cluster state...")
+    read_start: float = time.perf_counter()
+    plan: list[Step] = reconciler.plan()
+    print(f"  Done in {time.perf_counter() - read_start:.2f} s")
+
+    if not plan:
+        print("Cluster matches the manifest: nothing to do")
+    else:
+        print(f"{len(plan)} steps to apply:")
+        for step in plan:
+            print(f"  [{step.phase}] {step.description}")
+        if not args.dry_run:
+            print("Applying...")
+            for name, seconds in reconciler.apply(plan).items():
+                print(f"  {name:<24} {seconds:>7.2f} s")
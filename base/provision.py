@@ -0,0 +1,162 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from pymongo.errors import OperationFailure
+
+from base.db_logical import ConfigServerReplicaSet, ShardServerReplicaSet
+from base.db_physical import BaseMongoServer, MongoRouter
+from base.readiness import READY
+
+"""
+Brings up a sharded cluster with every independent step done in parallel.
+
+Servers are declared first without touching Docker (provision=False), so
+their names and ports are allocated exactly as before. The provisioner then
+runs one phase at a time, doing all the work within a phase concurrently:
+
+1. create and start every container, routers included (mongos keeps
+   retrying the config servers until they are ready)
+2. wait for the config and shard servers to answer
+3. initiate the config and shard replica sets
+4. wait for each replica set to elect its primary
+5. bring the member tags, priorities and votes of replica sets an earlier
+   run initiated in line with their servers
+6. wait for the routers to answer (needs the config replica set)
+7. add the shard replica sets to the cluster (needs a primary per shard)
+
+Each phase is timed, and the breakdown is returned by run(). Waits are
+event-driven (base/readiness.py), so a phase ends as soon as its last server
+is ready.
+"""
+
+
+class ClusterProvisioner:
+    config_replica_set: ConfigServerReplicaSet | None
+    routers: list[MongoRouter]
+    shard_replica_sets: list[ShardServerReplicaSet]
+    shard_router: MongoRouter | None
+    timeout: float
+    timings: dict[str, float]
+
+    def __init__(
+            self,
+            config_replica_set: ConfigServerReplicaSet | None = None,
+            routers: Iterable[MongoRouter] = (),
+            shard_replica_sets: Iterable[ShardServerReplicaSet] = (),
+            shard_router: MongoRouter | None = None,
+            timeout: float = 300,
+            workers: int = 16
+    ):
+        self.config_replica_set = config_replica_set
+        # DataCentre keeps its routers in a list shared by every data
+        # centre, so the same router can be passed in more than once
+        self.routers = list({
+            router.container_name: router for router in routers
+        }.values())
+        self.shard_replica_sets = list(shard_replica_sets)
+        self.shard_router = shard_router
+        self.timeout = timeout
+        self.timings = {}
+        self._workers = workers
+
+    def _replica_sets(self) -> list:
+        replica_sets: list = list(self.shard_replica_sets)
+        if self.config_replica_set is not None:
+            replica_sets.insert(0, self.config_replica_set)
+        return replica_sets
+
+    def _data_servers(self) -> list[BaseMongoServer]:
+        return [
+            server
+            for replica_set in self._replica_sets()
+            for server in replica_set.get_servers()
+        ]
+
+    def _parallel(self, func: Callable, items: list) -> list:
+        if not items:
+            return []
+        with ThreadPoolExecutor(
+                max_workers=min(self._workers, len(items))
+        ) as executor:
+            # list() re-raises the first failure
+            return list(executor.map(func, items))
+
+    def _wait_until_ready(self, server: BaseMongoServer):
+        if not server.wait_until(READY, self.timeout):
+            raise TimeoutError(
+                f"Timed out waiting for {server.container_name}"
+            )
+
+    def _phase(self, name: str, func: Callable, items: list) -> list:
+        print(f"  {name} ({len(items)})...")
+        start: float = time.perf_counter()
+        results: list = self._parallel(func, items)
+        self.timings[name] = time.perf_counter() - start
+        return results
+
+    @staticmethod
+    def _initiate(replica_set) -> dict | None:
+        try:
+            return replica_set.initiate_replica_set()
+        except OperationFailure:
+            # already initialized by an earlier run
+            return None
+
+    def _wait_for_primary(self, replica_set):
+        # after an election the preferred primary may not be the primary
+        if not replica_set.wait_for_primary(self.timeout):
+            raise TimeoutError(
+                f"Timed out waiting for a {replica_set.replica_set_name} "
+                f"primary"
+            )
+
+    @staticmethod
+    def _reconfigure(replica_set) -> dict | None:
+        return replica_set.reconfigure()
+
+    def _add_shard(self, replica_set: ShardServerReplicaSet) -> dict | None:
+        if self.shard_router.has_shard(replica_set.pref_primary):
+            return None
+        return self.shard_router.add_shard(replica_set.pref_primary)
+
+    def run(self) -> dict[str, float]:
+        start: float = time.perf_counter()
+        servers: list[BaseMongoServer] = [*self._data_servers(), *self.routers]
+
+        self._phase(
+            "create containers", lambda server: server.provision(), servers
+        )
+        self._phase(
+            "wait for data servers",
+            self._wait_until_ready,
+            self._data_servers()
+        )
+        initiated: list = self._phase(
+            "initiate replica sets", self._initiate, self._replica_sets()
+        )
+        self._phase(
+            "wait for primaries", self._wait_for_primary, self._replica_sets()
+        )
+        self._phase(
+            "reconfigure replica sets",
+            self._reconfigure,
+            [
+                replica_set
+                for replica_set, output in zip(
+                    self._replica_sets(), initiated
+                )
+                if output is None
+            ]
+        )
+        self._phase("wait for routers", self._wait_until_ready, self.routers)
+        if self.shard_router is not None:
+            self._phase("add shards", self._add_shard, self.shard_replica_sets)
+
+        self.timings["total"] = time.perf_counter() - start
+        return self.timings
+
+    def print_timings(self):
+        print("Provisioning time by phase:")
+        for name, seconds in self.timings.items():
+            print(f"  {name:<24} {seconds:>7.2f} s")
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.monitoring import ServerListener
+from pymongo.server_type import SERVER_TYPE
+
+from base.docker_init import DOCKER_CLIENT
+
+"""
+Event-driven server readiness.
+
+Instead of polling healthy() (a Docker API reload plus a new Mongo connection
+per call), readiness is pushed from two event sources:
+- the Docker events stream, which reports a container starting or dying the
+  moment it happens
+- the driver's server monitoring events, from one lightweight client per
+  server that heartbeats every HEARTBEAT_MS and reports the server type
+  (primary, secondary, mongos, ...) whenever it changes
+
+Both feed one condition variable, and wait_until() blocks on it until a
+server reaches a state or the deadline passes. Nothing polls.
+"""
+
+DOWN: str = "down"          # container is not running
+RUNNING: str = "running"    # container is running, mongo is not answering
+READY: str = "ready"        # mongo is answering
+PRIMARY: str = "primary"
+SECONDARY: str = "secondary"
+
+STATES: tuple[str, ...] = (DOWN, RUNNING, READY, PRIMARY, SECONDARY)
+
+# the driver does not heartbeat more often than every 500 ms
+HEARTBEAT_MS: int = 500
+
+STOP_ACTIONS: set[str] = {"die", "stop", "kill", "pause", "oom"}
+START_ACTIONS: set[str] = {"start", "restart", "unpause"}
+
+
+class _DriverListener(ServerListener):
+    def __init__(self, watch: "ServerWatch"):
+        self.watch = watch
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        self.watch.set_server_type(event.new_description.server_type)
+
+    def closed(self, event):
+        pass
+
+
+class ServerWatch:
+    """Readiness of one server, fed by the Docker and driver events."""
+    container_name: str
+    container_running: bool | None
+    server_type: int
+
+    def __init__(
+            self, monitor: "ReadinessMonitor", container_name: str, port: int
+    ):
+        self.monitor = monitor
+        self.container_name = container_name
+        self.container_running = None
+        self.server_type = SERVER_TYPE.Unknown
+        self.client = MongoClient(
+            "localhost",
+            port,
+            directConnection=True,
+            heartbeatFrequencyMS=HEARTBEAT_MS,
+            event_listeners=[_DriverListener(self)],
+        )
+
+    def set_container_running(self, running: bool):
+        with self.monitor.changed:
+            self.container_running = running
+            if not running:
+                # don't wait for a failed heartbeat to say the same thing
+                self.server_type = SERVER_TYPE.Unknown
+            self.monitor.changed.notify_all()
+
+    def set_server_type(self, server_type: int):
+        with self.monitor.changed:
+            self.server_type = server_type
+            self.monitor.changed.notify_all()
+
+    def state(self) -> str:
+        if self.container_running is False:
+            return DOWN
+        if self.server_type == SERVER_TYPE.Unknown:
+            return RUNNING if self.container_running else DOWN
+        if self.server_type == SERVER_TYPE.RSPrimary:
+            return PRIMARY
+        if self.server_type == SERVER_TYPE.RSSecondary:
+            return SECONDARY
+        return READY
+
+    def is_in(self, state: str) -> bool:
+        current: str = self.state()
+        if state == READY:
+            # a primary or secondary is also answering
+            return current in (READY, PRIMARY, SECONDARY)
+        return current == state
+
+
+class ReadinessMonitor:
+    watches: dict[str, ServerWatch]
+
+    def __init__(self):
+        self.watches = {}
+        self.changed = threading.Condition()
+        self._events_thread: threading.Thread | None = None
+
+    def _ensure_events_thread(self):
+        if self._events_thread is None:
+            self._events_thread = threading.Thread(
+                target=self._read_docker_events,
+                name="docker-events",
+                daemon=True
+            )
+            self._events_thread.start()
+
+    def _read_docker_events(self):
+        while True:
+            try:
+                for event in DOCKER_CLIENT.events(
+                        decode=True, filters={"type": "container"}
+                ):
+                    self._handle_docker_event(event)
+            except Exception:
+                # the daemon closed the stream; reconnect
+                time.sleep(1)
+
+    def _handle_docker_event(self, event: dict):
+        action: str = event.get("Action", event.get("status", ""))
+        name: str = event.get("Actor", {}).get("Attributes", {}).get("name")
+        watch: ServerWatch | None = self.watches.get(name)
+        if watch is None:
+            return
+        if action in STOP_ACTIONS:
+            watch.set_container_running(False)
+        elif action in START_ACTIONS:
+            watch.set_container_running(True)
+
+    def watch(self, container_name: str, port: int) -> ServerWatch:
+        with self.changed:
+            watch: ServerWatch | None = self.watches.get(container_name)
+            if watch is None:
+                watch = ServerWatch(self, container_name, port)
+                self.watches[container_name] = watch
+        self._ensure_events_thread()
+        if watch.container_running is None:
+            # seed with the current status; events keep it fresh from here
+            container = DOCKER_CLIENT.containers.get(container_name)
+            watch.set_container_running(container.status == "running")
+        return watch
+
+    def wait_for(
+            self, predicate, timeout: float | None = None
+    ) -> bool:
+        with self.changed:
+            return self.changed.wait_for(predicate, timeout)
+
+
+READINESS: ReadinessMonitor = ReadinessMonitor()
+
+
+def wait_until_all(
+        watches: list[ServerWatch], state: str, timeout: float | None = None
+) -> bool:
+    if state not in STATES:
+        raise ValueError(f"Unknown server state: {state}")
+    return READINESS.wait_for(
+        lambda: all(watch.is_in(state) for watch in watches), timeout
+    )
+
+
+def wait_until_any(
+        watches: list[ServerWatch], state: str, timeout: float | None = None
+) -> bool:
+    if state not in STATES:
+        raise ValueError(f"Unknown server state: {state}")
+    return READINESS.wait_for(
+        lambda: any(watch.is_in(state) for watch in watches), timeout
+    )
+
+
+async def wait_until_async(
+        watches: list[ServerWatch], state: str, timeout: float | None = None
+) -> bool:
+    return await asyncio.to_thread(wait_until_all, watches, state, timeout)
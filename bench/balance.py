@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+import httpx
+
+"""
+Measures how /weather/get requests are split across the routers, and the
+latency percentiles that result.
+
+The router that served each request is read from the X-Router response
+header; requests answered from the API cache have no router. Start the API
+with the policy to measure and the cache off, for example:
+    API_ROUTER_POLICY=p2c API_CACHE_TTL_MS=0 uvicorn api.main:app
+then run from the project root:
+    python -m bench.balance --url http://localhost:8000
+
+Repeat with API_ROUTER_POLICY=first for the old behaviour, where one router
+takes every request.
+"""
+
+CACHED: str = "(cache)"
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered: list[float] = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def run(
+        client: httpx.AsyncClient, concurrency: int, total: int,
+        lon: float, lat: float, spread: float
+) -> tuple[Counter, dict[str, list[float]], int, float]:
+    served: Counter = Counter()
+    latencies: dict[str, list[float]] = {}
+    errors: int = 0
+    remaining: list[int] = [total]
+
+    async def worker():
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            body: dict = {
+                "lon": lon + random.uniform(-spread, spread),
+                "lat": lat + random.uniform(-spread, spread),
+            }
+            start: float = time.perf_counter()
+            resp = await client.post("/weather/get", json=body)
+            elapsed: float = time.perf_counter() - start
+            router: str = resp.headers.get("x-router", CACHED)
+            served[router] += 1
+            latencies.setdefault(router, []).append(elapsed)
+            if resp.status_code not in (200, 404):
+                errors += 1
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return served, latencies, errors, time.perf_counter() - start
+
+
+async def main(args: argparse.Namespace):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+            base_url=args.url, limits=limits, timeout=30
+    ) as client:
+        # warm up the API's connection pools before measuring
+        await run(client, 4, 20, args.lon, args.lat, args.spread)
+
+        served, latencies, errors, elapsed = await run(
+            client, args.concurrency, args.requests,
+            args.lon, args.lat, args.spread
+        )
+        balancer: dict = (await client.get("/admin/balancer")).json()
+
+    print(f"policy: {balancer['policy']}, {args.requests / elapsed:.1f} req/s,"
+          f" {errors} errors")
+    print(f"{'router':<34} {'share':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8}")
+    for router, count in served.most_common():
+        times: list[float] = latencies[router]
+        print(
+            f"{router:<34} {count / args.requests:>7.1%} "
+            f"{1000 * percentile(times, 0.5):>8.1f} "
+            f"{1000 * percentile(times, 0.95):>8.1f} "
+            f"{1000 * percentile(times, 0.99):>8.1f}"
+        )
+    every: list[float] = [t for times in latencies.values() for t in times]
+    print(
+        f"{'all':<34} {1:>7.1%} "
+        f"{1000 * percentile(every, 0.5):>8.1f} "
+        f"{1000 * percentile(every, 0.95):>8.1f} "
+        f"{1000 * percentile(every, 0.99):>8.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--lon", type=float, default=-79)
+    parser.add_argument("--lat", type=float, default=45)
+    # degrees either side of lon/lat, so requests do not share a cache cell
+    parser.add_argument("--spread", type=float, default=2)
+    asyncio.run(main(parser.parse_args()))
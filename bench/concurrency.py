@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+"""
+Measures how /weather/get throughput scales with the number of requests in
+flight.
+
+Start the API first (uvicorn api.main:app), then run from the project root:
+    python -m bench.concurrency --url http://localhost:8000
+
+With a blocking request path, requests per second stays flat no matter how
+many requests are in flight. With the executor it should rise until the
+thread pool or the cluster saturates.
+"""
+
+DEFAULT_LEVELS: list[int] = [1, 2, 4, 8, 16, 32, 64]
+
+
+async def run_level(
+        client: httpx.AsyncClient, concurrency: int, total: int, body: dict
+) -> dict:
+    latencies: list[float] = []
+    errors: int = 0
+    remaining: list[int] = [total]
+
+    async def worker():
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start: float = time.perf_counter()
+            resp = await client.post("/weather/get", json=body)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                errors += 1
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed: float = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed,
+        "mean_ms": 1000 * sum(latencies) / len(latencies),
+    }
+
+
+async def main(args: argparse.Namespace):
+    body: dict = {"lon": args.lon, "lat": args.lat}
+    limits = httpx.Limits(max_connections=max(args.levels))
+    async with httpx.AsyncClient(
+            base_url=args.url, limits=limits, timeout=30
+    ) as client:
+        # warm up the API's connection pools before measuring
+        await run_level(client, 1, 10, body)
+
+        print(f"{'in-flight':>10} {'req/s':>10} {'mean ms':>10} {'errors':>8}")
+        for level in args.levels:
+            result: dict = await run_level(client, level, args.requests, body)
+            print(
+                f"{result['concurrency']:>10} {result['rps']:>10.1f} "
+                f"{result['mean_ms']:>10.1f} {result['errors']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--levels", type=int, nargs="+", default=DEFAULT_LEVELS
+    )
+    parser.add_argument("--lon", type=float, default=-79)
+    parser.add_argument("--lat", type=float, default=45)
+    asyncio.run(main(parser.parse_args()))
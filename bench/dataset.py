@@ -0,0 +1,342 @@
+import argparse
+import datetime
+import itertools
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+from pymongo.errors import BulkWriteError
+
+from api.clients import CLIENT_REGISTRY
+from api.db import DB_NAME, COLLECTION_NAME, normalize_report
+from api.latest import rebuild_latest
+from api.serialize import TIME_FMT
+from api.topology import RouterEndpoint, load_routers
+
+"""
+Synthetic Environment Canada weather reports, at any scale.
+
+Stations are spread over the provinces and territories in proportion to
+where the real citypage stations are, each at a fixed point inside its
+province's bounds. Every station reports once per --interval-minutes for
+--hours of history. Reports have the fields the API reads (location with
+province, currentConditions, forecastGroup, geolocation, stationLongitude,
+timestamp), with conditions that follow latitude, season and time of day,
+so nearest-station lookups and the stationLongitude zones see realistic
+data. Timestamps are strings in the API's wire format (TIME_FMT) and are
+stored as BSON dates, as the API stores them.
+
+Reports are generated lazily, oldest first, and loaded with unordered
+insert_many batches spread over every router (or the ones in API_ROUTERS)
+from a pool of threads. At most two batches per worker are held in memory,
+so millions of reports can be loaded without building them all first.
+weather_latest is rebuilt once at the end instead of per batch.
+
+Run from the project root, e.g. 2000 stations with 30 days of hourly
+history (1.44 million reports):
+    python -m bench.dataset --stations 2000 --hours 720
+"""
+
+
+# code, name, share of stations, (lon min, lon max), (lat min, lat max)
+PROVINCES: list[tuple[str, str, float, tuple, tuple]] = [
+    ("bc", "British Columbia", 0.14, (-133.0, -115.0), (48.5, 59.5)),
+    ("ab", "Alberta", 0.09, (-119.5, -110.2), (49.1, 59.5)),
+    ("sk", "Saskatchewan", 0.06, (-109.8, -101.6), (49.1, 59.5)),
+    ("mb", "Manitoba", 0.06, (-101.3, -95.3), (49.1, 59.5)),
+    ("on", "Ontario", 0.26, (-94.5, -74.5), (42.0, 54.0)),
+    ("qc", "Quebec", 0.22, (-79.3, -58.0), (45.1, 58.0)),
+    ("nb", "New Brunswick", 0.04, (-68.9, -64.2), (45.1, 47.9)),
+    ("ns", "Nova Scotia", 0.04, (-66.2, -60.0), (43.5, 47.0)),
+    ("pe", "Prince Edward Island", 0.01, (-64.4, -62.0), (46.0, 47.0)),
+    ("nl", "Newfoundland and Labrador", 0.04, (-67.0, -52.8), (46.7, 58.5)),
+    ("yt", "Yukon", 0.01, (-140.5, -124.0), (60.1, 69.0)),
+    ("nt", "Northwest Territories", 0.02, (-135.0, -102.0), (60.1, 69.0)),
+    ("nu", "Nunavut", 0.01, (-102.0, -62.0), (60.1, 72.0)),
+]
+
+CONDITIONS: list[str] = [
+    "Sunny", "Mainly Sunny", "Partly Cloudy", "Mostly Cloudy", "Cloudy",
+    "Light Rain", "Rain", "Light Snow", "Snow", "Fog", "Drizzle",
+]
+DIRECTIONS: list[str] = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+PERIODS: list[str] = [
+    "Today", "Tonight", "Monday", "Monday night", "Tuesday", "Tuesday night",
+    "Wednesday", "Wednesday night", "Thursday", "Thursday night", "Friday",
+    "Friday night", "Saturday",
+]
+
+
+class Station:
+    code: str
+    name: str
+    province: tuple
+    lon: float
+    lat: float
+
+    def __init__(
+            self, code: str, name: str, province: tuple, lon: float,
+            lat: float
+    ):
+        self.code = code
+        self.name = name
+        self.province = province
+        self.lon = lon
+        self.lat = lat
+
+
+def make_stations(count: int, seed: int = 1) -> list[Station]:
+    rng: random.Random = random.Random(seed)
+    weights: list[float] = [province[2] for province in PROVINCES]
+    stations: list[Station] = []
+    for idx in range(count):
+        province: tuple = rng.choices(PROVINCES, weights=weights)[0]
+        stations.append(Station(
+            code=f"s{idx:07d}",
+            name=f"{province[1]} station {idx}",
+            province=province,
+            lon=round(rng.uniform(*province[3]), 4),
+            lat=round(rng.uniform(*province[4]), 4),
+        ))
+    return stations
+
+
+def _value(value: float | str, units: str = "C") -> dict:
+    text: str = f"{value:.1f}" if isinstance(value, float) else str(value)
+    return {"text": text, "unitType": "metric", "units": units}
+
+
+def _temperature(station: Station, when: datetime.datetime) -> float:
+    # colder further north, in winter, and at night
+    year_day: int = when.timetuple().tm_yday
+    season: float = math.cos(2 * math.pi * (year_day - 200) / 365)
+    day: float = math.cos(2 * math.pi * (when.hour - 15) / 24)
+    return 30 - 0.9 * (station.lat - 42) + 15 * (season - 1) + 5 * day
+
+
+def _forecast(
+        idx: int, high: float, rng: random.Random
+) -> dict:
+    condition: str = rng.choice(CONDITIONS)
+    temperature: float = high + rng.uniform(-4, 4) - (idx % 2) * 8
+    summary: str = f"{condition}. {'Low' if idx % 2 else 'High'} " \
+                   f"{temperature:.0f}."
+    return {
+        "period": {"text": PERIODS[idx], "textForecastName": PERIODS[idx]},
+        "textSummary": summary,
+        "abbreviatedForecast": {
+            "iconCode": {"format": "gif", "text": f"{rng.randint(0, 40):02d}"},
+            "pop": _value(str(rng.choice([0, 0, 30, 40, 60, 70])), "%"),
+            "textSummary": condition,
+        },
+        "temperatures": {
+            "textSummary": summary,
+            "temperature": _value(temperature),
+        },
+        "winds": {
+            "wind": [{
+                "speed": _value(str(rng.randint(5, 40)), "km/h"),
+                "direction": rng.choice(DIRECTIONS),
+            }]
+        },
+        "relativeHumidity": _value(str(rng.randint(30, 100)), "%"),
+    }
+
+
+def make_report(
+        station: Station, when: datetime.datetime, rng: random.Random,
+        forecasts: int = 13
+) -> dict:
+    temperature: float = _temperature(station, when) + rng.uniform(-3, 3)
+    humidity: int = rng.randint(30, 100)
+    code, name = station.province[0], station.province[1]
+    return {
+        "license": "https://dd.weather.gc.ca/doc/LICENCE_GENERAL.txt",
+        "timestamp": when.strftime(TIME_FMT),
+        "geolocation": {
+            "type": "Point", "coordinates": [station.lon, station.lat]
+        },
+        "stationLongitude": station.lon,
+        "location": {
+            "continent": "North America",
+            "country": {"code": "ca", "text": "Canada"},
+            "province": {"code": code, "text": name},
+            "name": {
+                "code": station.code,
+                "lat": f"{abs(station.lat):.2f}N",
+                "lon": f"{abs(station.lon):.2f}W",
+                "text": station.name,
+            },
+            "region": name,
+        },
+        "currentConditions": {
+            "station": {"code": station.code, "text": station.name},
+            "dateTime": {"zone": "UTC", "timeStamp": when.strftime(
+                "%Y%m%d%H%M%S"
+            )},
+            "condition": rng.choice(CONDITIONS),
+            "temperature": _value(temperature),
+            "dewpoint": _value(temperature - (100 - humidity) / 5),
+            "pressure": {
+                "text": f"{rng.uniform(98.5, 103.5):.1f}",
+                "tendency": rng.choice(["rising", "falling", "steady"]),
+                "unitType": "metric", "units": "kPa",
+            },
+            "visibility": _value(rng.uniform(0.5, 40), "km"),
+            "relativeHumidity": _value(str(humidity), "%"),
+            "wind": {
+                "speed": _value(str(rng.randint(0, 50)), "km/h"),
+                "direction": rng.choice(DIRECTIONS),
+                "bearing": _value(rng.uniform(0, 360), "degrees"),
+            },
+        },
+        "forecastGroup": {
+            "dateTime": {"zone": "UTC", "timeStamp": when.strftime(
+                "%Y%m%d%H%M%S"
+            )},
+            "forecast": [
+                _forecast(idx, temperature + 2, rng)
+                for idx in range(forecasts)
+            ],
+        },
+    }
+
+
+def iter_reports(
+        stations: list[Station], hours: int, interval_minutes: int = 60,
+        end: datetime.datetime | None = None, seed: int = 1,
+        forecasts: int = 13
+) -> Iterator[dict]:
+    """Every station's reports, oldest first, ending at end (default now)."""
+    rng: random.Random = random.Random(seed)
+    if end is None:
+        end = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+    steps: int = hours * 60 // interval_minutes
+    for step in range(steps - 1, -1, -1):
+        when: datetime.datetime = end - datetime.timedelta(
+            minutes=step * interval_minutes
+        )
+        for station in stations:
+            yield make_report(station, when, rng, forecasts)
+
+
+def iter_batches(docs: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    docs = iter(docs)
+    while batch := list(itertools.islice(docs, size)):
+        yield batch
+
+
+class BulkLoader:
+    """Parallel unordered insert_many batches, spread over the routers."""
+    routers: list[RouterEndpoint]
+    inserted: int
+    failed: int
+
+    def __init__(self, routers: list[RouterEndpoint], workers: int):
+        self.routers = routers
+        self.workers = workers
+        self.inserted = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        # bounds the batches that are built but not yet written
+        self._slots = threading.BoundedSemaphore(2 * workers)
+
+    def _write(self, router: RouterEndpoint, batch: list[dict]):
+        try:
+            coll = CLIENT_REGISTRY.get_client(router)\
+                .get_database(DB_NAME).get_collection(COLLECTION_NAME)
+            failed: int = 0
+            try:
+                coll.insert_many(
+                    [normalize_report(doc) for doc in batch], ordered=False
+                )
+            except BulkWriteError as err:
+                failed = len(err.details["writeErrors"])
+            with self._lock:
+                self.inserted += len(batch) - failed
+                self.failed += failed
+        finally:
+            self._slots.release()
+
+    def load(
+            self, docs: Iterable[dict], batch_size: int,
+            progress_every: float = 5
+    ) -> int:
+        start: float = time.perf_counter()
+        last_report: float = start
+        routers = itertools.cycle(self.routers)
+        futures: list = []
+        with ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="bulk-load"
+        ) as executor:
+            for batch in iter_batches(docs, batch_size):
+                self._slots.acquire()
+                futures.append(
+                    executor.submit(self._write, next(routers), batch)
+                )
+                now: float = time.perf_counter()
+                if now - last_report >= progress_every:
+                    last_report = now
+                    print(f"  {self.inserted} reports, "
+                          f"{self.inserted / (now - start):.0f}/s")
+                # result() re-raises a failed batch straight away
+                for future in futures:
+                    if future.done():
+                        future.result()
+                futures = [future for future in futures if not future.done()]
+            for future in futures:
+                future.result()
+        return self.inserted
+
+
+def main(args: argparse.Namespace):
+    stations: list[Station] = make_stations(args.stations, args.seed)
+    docs = iter_reports(
+        stations, args.hours, args.interval_minutes, seed=args.seed,
+        forecasts=args.forecasts
+    )
+    total: int = args.stations * (args.hours * 60 // args.interval_minutes)
+    print(f"{args.stations} stations, {total} reports")
+
+    if args.dry_run:
+        start: float = time.perf_counter()
+        count: int = sum(1 for _ in itertools.islice(docs, 10000))
+        print(f"generated {count / (time.perf_counter() - start):.0f} "
+              f"reports/s (not loaded)")
+        return
+
+    routers: list[RouterEndpoint] = load_routers()
+    print(f"Loading through {len(routers)} routers with {args.workers} "
+          f"workers...")
+    loader: BulkLoader = BulkLoader(routers, args.workers)
+    start = time.perf_counter()
+    loader.load(docs, args.batch_size)
+    elapsed: float = time.perf_counter() - start
+    print(f"  {loader.inserted} inserted, {loader.failed} failed in "
+          f"{elapsed:.1f} s ({loader.inserted / elapsed:.0f}/s)")
+
+    if not args.skip_latest:
+        print("Rebuilding weather_latest...")
+        rebuild_latest(
+            CLIENT_REGISTRY.get_client(routers[0]).get_database(DB_NAME),
+            COLLECTION_NAME
+        )
+        print("  Done")
+    CLIENT_REGISTRY.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--interval-minutes", type=int, default=60)
+    parser.add_argument("--forecasts", type=int, default=13)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-latest", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    main(parser.parse_args())
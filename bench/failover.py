@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import time
+
+import docker
+import httpx
+
+"""
+Kills a router while /weather/get is under load, and shows how the API rides
+it out.
+
+Requests run at a fixed concurrency for --duration seconds. After --kill-at
+seconds the router container is stopped (docker stop, or docker kill with
+--signal KILL), and after --restart-at seconds it is started again. Each
+second of the run is reported with the requests that finished in it, how
+many failed, and the slowest one.
+
+Start the API in the mode to compare, with the cache off, for example:
+    API_ROUTER_MODE=seed_list API_CACHE_TTL_MS=0 uvicorn api.main:app
+    API_ROUTER_MODE=per_router API_CACHE_TTL_MS=0 uvicorn api.main:app
+then run from the project root:
+    python -m bench.failover --router dc-TORONTO_type-ROUTER_dcid-0
+"""
+
+
+async def load(
+        client: httpx.AsyncClient, concurrency: int, duration: float,
+        body: dict
+) -> list[tuple[float, float, bool]]:
+    """(finish time, latency, ok) for every request."""
+    results: list[tuple[float, float, bool]] = []
+    start: float = time.perf_counter()
+
+    async def worker():
+        while time.perf_counter() - start < duration:
+            sent: float = time.perf_counter()
+            try:
+                resp = await client.post("/weather/get", json=body)
+                ok: bool = resp.status_code in (200, 404)
+            except httpx.HTTPError:
+                ok = False
+            done: float = time.perf_counter()
+            results.append((done - start, done - sent, ok))
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return results
+
+
+async def chaos(
+        container, kill_at: float, restart_at: float, signal: str | None
+) -> dict[str, float]:
+    events: dict[str, float] = {}
+    start: float = time.perf_counter()
+    await asyncio.sleep(kill_at)
+    events["killed"] = time.perf_counter() - start
+    if signal:
+        await asyncio.to_thread(container.kill, signal)
+    else:
+        await asyncio.to_thread(container.stop, timeout=0)
+    await asyncio.sleep(max(restart_at - kill_at, 0))
+    events["restarted"] = time.perf_counter() - start
+    await asyncio.to_thread(container.start)
+    return events
+
+
+async def main(args: argparse.Namespace):
+    container = docker.from_env().containers.get(args.router)
+    body: dict = {"lon": args.lon, "lat": args.lat}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+            base_url=args.url, limits=limits, timeout=30
+    ) as client:
+        results, events = await asyncio.gather(
+            load(client, args.concurrency, args.duration, body),
+            chaos(container, args.kill_at, args.restart_at, args.signal)
+        )
+        routers: dict = (await client.get("/admin/routers")).json()
+
+    print(f"router states at the end: {routers}")
+    print(f"stopped {args.router} at {events['killed']:.1f} s, "
+          f"started it at {events['restarted']:.1f} s")
+    print(f"{'second':>6} {'requests':>9} {'errors':>7} {'max ms':>8}")
+    for second in range(int(args.duration)):
+        window = [
+            (latency, ok) for done, latency, ok in results
+            if second <= done < second + 1
+        ]
+        errors: int = sum(not ok for _, ok in window)
+        slowest: float = max((latency for latency, _ in window), default=0)
+        print(f"{second:>6} {len(window):>9} {errors:>7} "
+              f"{1000 * slowest:>8.1f}")
+
+    failed: int = sum(not ok for _, _, ok in results)
+    print(f"total: {len(results)} requests, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--router", required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--kill-at", type=float, default=10)
+    parser.add_argument("--restart-at", type=float, default=20)
+    # e.g. KILL, for a crash instead of a clean shutdown
+    parser.add_argument("--signal", default=None)
+    parser.add_argument("--lon", type=float, default=-79)
+    parser.add_argument("--lat", type=float, default=45)
+    asyncio.run(main(parser.parse_args()))
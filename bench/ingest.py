@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from bench.dataset import Station, make_stations, iter_reports
+from bench.loadtest import post_bulk, make_client
+
+"""
+Ingest throughput of /weather/post/bulk against one report per
+/weather/post request.
+
+The same number of generated reports (bench/dataset.py) is written both
+ways: single posts with --concurrency requests in flight, and NDJSON bulk
+posts of --batch-size reports. Reports per second and the ratio between the
+two are printed.
+
+Start the API first (uvicorn api.main:app), then run from the project root:
+    python -m bench.ingest --url http://localhost:8000 --reports 5000
+or run the API in this process on the in-memory stand-in for the cluster
+(bench/standin.py), which measures everything above the database calls:
+    python -m bench.ingest --standin
+"""
+
+
+async def post_single(
+        client: httpx.AsyncClient, docs: list[dict], concurrency: int
+) -> tuple[float, int]:
+    """Seconds taken and reports written, one report per request."""
+    pending = iter(docs)
+    written: list[int] = [0]
+
+    async def worker():
+        for doc in pending:
+            resp = await client.post("/weather/post", json=doc)
+            written[0] += resp.status_code == 200
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - start, written[0]
+
+
+async def post_batches(
+        client: httpx.AsyncClient, docs: list[dict], batch_size: int
+) -> tuple[float, int]:
+    """Seconds taken and reports written, batch_size reports per request."""
+    written: int = 0
+    start: float = time.perf_counter()
+    for idx in range(0, len(docs), batch_size):
+        written += await post_bulk(client, docs[idx:idx + batch_size])
+    return time.perf_counter() - start, written
+
+
+async def main(args: argparse.Namespace):
+    stations: list[Station] = make_stations(args.stations, args.seed)
+    hours: int = -(-args.reports // args.stations)
+    docs: list[dict] = list(
+        iter_reports(stations, hours, seed=args.seed)
+    )[:args.reports]
+
+    app = None
+    if args.standin:
+        from api.main import app
+        from bench.standin import StandInBackend
+
+        StandInBackend(args.standin_latency_ms).install()
+
+    async with make_client(
+            None if args.standin else args.url, app, args.concurrency
+    ) as client:
+        if app is not None:
+            await app.router.startup()
+
+        # warm up the API's connection pools before measuring
+        await post_single(client, docs[:10], 1)
+
+        # each mode writes its own copy, since inserts set _id on the dict
+        single_s, single = await post_single(
+            client, [dict(doc) for doc in docs], args.concurrency
+        )
+        bulk_s, bulk = await post_batches(
+            client, [dict(doc) for doc in docs], args.batch_size
+        )
+
+        if app is not None:
+            await app.router.shutdown()
+
+    print(f"{'mode':<28} {'reports':>8} {'seconds':>8} {'reports/s':>10}")
+    print(f"{f'single ({args.concurrency} in flight)':<28} {single:>8} "
+          f"{single_s:>8.2f} {single / single_s:>10.0f}")
+    print(f"{f'bulk ({args.batch_size} per request)':<28} {bulk:>8} "
+          f"{bulk_s:>8.2f} {bulk / bulk_s:>10.0f}")
+    print(f"bulk / single: {(bulk / bulk_s) / (single / single_s):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--standin", action="store_true")
+    parser.add_argument("--standin-latency-ms", type=float, default=1.0)
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import random
+import subprocess
+import time
+
+import httpx
+
+from bench.balance import percentile
+from bench.dataset import Station, make_stations, make_report, iter_reports
+
+"""
+Non-interactive load test of the weather API.
+
+Runs a mix of requests at one or more concurrency levels and writes the
+throughput and the p50/p95/p99 latency of every level, overall and per
+request type, to a JSON file (--output). Operations:
+- get: POST /weather/get near a random station
+- batch: POST /weather/get/batch with --batch-size locations
+- post: POST /weather/post with a new report for a random station
+
+Backends:
+- standin (default): the API runs in this process on an in-memory
+  stand-in for the cluster (bench/standin.py), so no Docker is needed.
+  Everything above the database calls is measured.
+- cluster: the API runs in this process against the routers it is
+  configured with (api.topology), so api.db and the cluster are measured
+  too. The dataset is loaded through /weather/post/bulk first unless
+  --no-load is given.
+With --url the requests go to an API that is already running instead, and
+--backend only decides whether the dataset is loaded.
+
+Reports come from bench/dataset.py. Run from the project root, e.g.:
+    python -m bench.loadtest --levels 1 8 32 --mix get=80,batch=5,post=15 \\
+        --stations 2000 --history 3 --output results.json
+"""
+
+OPERATIONS: tuple[str, ...] = ("get", "batch", "post")
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for entry in spec.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def load_dataset(
+        client: httpx.AsyncClient, docs, batch_size: int = 1000
+) -> int:
+    loaded: int = 0
+    batch: list[dict] = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            loaded += await post_bulk(client, batch)
+            batch = []
+    if batch:
+        loaded += await post_bulk(client, batch)
+    return loaded
+
+
+async def post_bulk(client: httpx.AsyncClient, docs: list[dict]) -> int:
+    body: bytes = "\n".join(json.dumps(doc) for doc in docs).encode()
+    resp = await client.post(
+        "/weather/post/bulk", content=body,
+        headers={"content-type": "application/x-ndjson"}
+    )
+    resp.raise_for_status()
+    return resp.json()["inserted"]
+
+
+class Workload:
+    mix: dict[str, float]
+    stations: list[Station]
+
+    def __init__(
+            self, mix: dict[str, float], stations: list[Station],
+            batch_size: int, fields: list[str] | None, seed: int
+    ):
+        self.mix = mix
+        self.stations = stations
+        self.batch_size = batch_size
+        self.fields = fields
+        self.rng = random.Random(seed)
+
+    def _near_station(self) -> dict:
+        station: Station = self.rng.choice(self.stations)
+        # a little way off, so lookups are spread over many cache cells
+        return {
+            "lon": station.lon + self.rng.uniform(-0.5, 0.5),
+            "lat": station.lat + self.rng.uniform(-0.5, 0.5),
+        }
+
+    def next_request(self) -> tuple[str, str, dict]:
+        op: str = self.rng.choices(
+            list(self.mix), weights=list(self.mix.values())
+        )[0]
+        if op == "get":
+            body: dict = self._near_station()
+            if self.fields:
+                body["fields"] = self.fields
+            return op, "/weather/get", body
+        if op == "batch":
+            body = {
+                "locations": [
+                    self._near_station() for _ in range(self.batch_size)
+                ]
+            }
+            if self.fields:
+                body["fields"] = self.fields
+            return op, "/weather/get/batch", body
+        return op, "/weather/post", make_report(
+            self.rng.choice(self.stations), datetime.datetime.utcnow(),
+            self.rng
+        )
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "mean_ms": 1000 * sum(latencies) / len(latencies),
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+        "max_ms": 1000 * max(latencies),
+    }
+
+
+async def run_level(
+        client: httpx.AsyncClient, workload: Workload, concurrency: int,
+        duration: float
+) -> dict:
+    latencies: dict[str, list[float]] = {op: [] for op in workload.mix}
+    errors: dict[str, int] = {op: 0 for op in workload.mix}
+    start: float = time.perf_counter()
+
+    async def worker():
+        while time.perf_counter() - start < duration:
+            op, path, body = workload.next_request()
+            sent: float = time.perf_counter()
+            try:
+                resp = await client.post(path, json=body)
+                # 404 is a valid answer: no station within range
+                failed: bool = resp.status_code not in (200, 404)
+            except httpx.HTTPError:
+                failed = True
+            latencies[op].append(time.perf_counter() - sent)
+            errors[op] += failed
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed: float = time.perf_counter() - start
+
+    every: list[float] = [t for times in latencies.values() for t in times]
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        **summarize(every, sum(errors.values()), elapsed),
+        "operations": {
+            op: summarize(latencies[op], errors[op], elapsed)
+            for op in workload.mix
+        },
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_client(
+        url: str | None, app, concurrency: int
+) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=concurrency)
+    if url:
+        return httpx.AsyncClient(base_url=url, limits=limits, timeout=30)
+    return httpx.AsyncClient(
+        app=app, base_url="http://api", limits=limits, timeout=30
+    )
+
+
+async def main(args: argparse.Namespace):
+    started: str = datetime.datetime.utcnow().isoformat()
+    mix: dict[str, float] = parse_mix(args.mix)
+    stations: list[Station] = make_stations(args.stations, args.seed)
+    workload: Workload = Workload(
+        mix, stations, args.batch_size,
+        args.fields.split(",") if args.fields else None, args.seed
+    )
+
+    # imported here so the stand-in is in place before the app is used
+    app = None
+    backend = None
+    if args.url is None:
+        from api.main import app
+        if args.backend == "standin":
+            from bench.standin import StandInBackend
+
+            backend = StandInBackend(args.standin_latency_ms)
+            backend.install()
+
+    async with make_client(args.url, app, max(args.levels)) as client:
+        if app is not None:
+            await app.router.startup()
+
+        load_start: float = time.perf_counter()
+        loaded: int = 0
+        dataset = iter_reports(stations, args.history, seed=args.seed)
+        if backend is not None:
+            loaded = backend.load(list(dataset))
+        elif not args.no_load:
+            loaded = await load_dataset(client, dataset)
+        print(f"loaded {loaded} reports in "
+              f"{time.perf_counter() - load_start:.1f} s")
+
+        # warm up pools and caches before measuring
+        await run_level(client, workload, 4, args.warmup)
+
+        levels: list[dict] = []
+        print(f"{'in-flight':>10} {'req/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'errors':>7}")
+        for concurrency in args.levels:
+            level: dict = await run_level(
+                client, workload, concurrency, args.duration
+            )
+            levels.append(level)
+            print(
+                f"{concurrency:>10} {level.get('rps', 0):>10.1f} "
+                f"{level.get('p50_ms', 0):>8.1f} "
+                f"{level.get('p95_ms', 0):>8.1f} "
+                f"{level.get('p99_ms', 0):>8.1f} {level['errors']:>7}"
+            )
+
+        if app is not None:
+            await app.router.shutdown()
+
+    results: dict = {
+        "started": started,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "target": args.url or f"in-process ({args.backend})",
+        "settings": {
+            "mix": mix,
+            "stations": args.stations,
+            "history": args.history,
+            "batch_size": args.batch_size,
+            "fields": workload.fields,
+            "duration_s": args.duration,
+            "seed": args.seed,
+        },
+        "levels": levels,
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backend", choices=["standin", "cluster"], default="standin"
+    )
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--mix", default="get=80,batch=5,post=15")
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--fields", default=None)
+    parser.add_argument("--no-load", action="store_true")
+    parser.add_argument("--standin-latency-ms", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="loadtest.json")
+    asyncio.run(main(parser.parse_args()))
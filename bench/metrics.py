@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import time
+import timeit
+
+import httpx
+from fastapi import FastAPI
+
+from api.metrics import Counter, Histogram, CommandMetrics, \
+    MetricsMiddleware, METRICS
+
+"""
+Overhead of the /metrics instrumentation on the request path.
+
+- the cost of each recording call on its own (counter, histogram, driver
+  command listener)
+- the cost per request of MetricsMiddleware, around an ASGI app that does
+  nothing, and around a trivial FastAPI endpoint called in-process with and
+  without it (this difference is usually within the run-to-run noise)
+- the cost of rendering /metrics for the current registry
+
+Run from the project root:
+    python -m bench.metrics
+"""
+
+
+class _CommandEvent:
+    """The fields CommandMetrics reads from a pymongo command event."""
+    connection_id: tuple[str, int] = ("localhost", 27021)
+    command_name: str = "find"
+    duration_micros: int = 850
+
+
+def per_call_us(func, number: int) -> float:
+    return 1e6 * min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": 1}
+
+    return app
+
+
+async def per_request_us(requests: int, rounds: int) -> tuple[float, float]:
+    """Best time per request without and with the middleware."""
+    best: list[float] = [float("inf"), float("inf")]
+    async with httpx.AsyncClient(
+            app=make_app(False), base_url="http://api"
+    ) as plain, httpx.AsyncClient(
+            app=make_app(True), base_url="http://api"
+    ) as timed:
+        # alternate the two so drift in machine load hits both equally
+        for _ in range(rounds):
+            for idx, client in enumerate([plain, timed]):
+                start: float = time.perf_counter()
+                for _ in range(requests):
+                    await client.get("/ping")
+                best[idx] = min(best[idx], time.perf_counter() - start)
+    return 1e6 * best[0] / requests, 1e6 * best[1] / requests
+
+
+async def middleware_us(calls: int) -> float:
+    """The middleware around an ASGI app that does nothing."""
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200})
+
+    async def send(message):
+        pass
+
+    middleware = MetricsMiddleware(endpoint)
+    middleware.endpoints = {"/ping"}
+    scope: dict = {"type": "http", "path": "/ping", "method": "GET"}
+    best: list[float] = [float("inf"), float("inf")]
+    for _ in range(5):
+        for idx, app in enumerate([endpoint, middleware]):
+            start: float = time.perf_counter()
+            for _ in range(calls):
+                await app(scope, None, send)
+            best[idx] = min(best[idx], time.perf_counter() - start)
+    return 1e6 * (best[1] - best[0]) / calls
+
+
+def main(args: argparse.Namespace):
+    counter = Counter("bench_total", "", ("endpoint", "status"))
+    histogram = Histogram("bench_seconds", "", ("endpoint",))
+    listener = CommandMetrics("router", {"localhost:27021": "router"})
+    event = _CommandEvent()
+
+    print("per recording call:")
+    for name, func in [
+        ("counter inc", lambda: counter.inc("/weather/get", 200)),
+        ("histogram observe", lambda: histogram.observe(0.004, "/weather")),
+        ("command listener", lambda: listener.succeeded(event)),
+    ]:
+        print(f"  {name:<20} {per_call_us(func, args.calls):>8.2f} us")
+
+    middleware: float = asyncio.run(middleware_us(args.calls))
+    print(f"  {'middleware':<20} {middleware:>8.2f} us")
+
+    plain, timed = asyncio.run(per_request_us(args.requests, args.rounds))
+    print("per request (in-process, trivial endpoint):")
+    print(f"  {'without metrics':<20} {plain:>8.1f} us")
+    print(f"  {'with metrics':<20} {timed:>8.1f} us")
+    print(f"  {'overhead':<20} {timed - plain:>8.1f} us")
+
+    render: float = per_call_us(METRICS.render, 200)
+    print(f"render /metrics: {render:.0f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    main(parser.parse_args())
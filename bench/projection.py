@@ -0,0 +1,57 @@
+import argparse
+import time
+
+import httpx
+
+"""
+Payload size and latency of /weather/get for common field selections.
+
+Start the API with the response cache off so every request reaches the
+cluster (API_CACHE_TTL_MS=0 uvicorn api.main:app), then run from the project
+root:
+    python -m bench.projection --url http://localhost:8000
+"""
+
+FIELD_SETS: dict[str, list[str] | None] = {
+    "everything": None,
+    "current conditions": ["currentConditions"],
+    "current + location": ["currentConditions", "location", "timestamp"],
+    "temperature only": ["currentConditions.temperature"],
+    "forecast widget": ["forecastGroup", "location"],
+    "hourly widget": ["hourlyForecastGroup", "location"],
+}
+
+
+def measure(
+        client: httpx.Client, body: dict, requests: int
+) -> tuple[int, float]:
+    size: int = 0
+    start: float = time.perf_counter()
+    for _ in range(requests):
+        resp = client.post("/weather/get", json=body)
+        resp.raise_for_status()
+        size = len(resp.content)
+    elapsed: float = time.perf_counter() - start
+    return size, 1000 * elapsed / requests
+
+
+def main(args: argparse.Namespace):
+    with httpx.Client(base_url=args.url, timeout=30) as client:
+        print(f"{'field set':<20} {'bytes':>10} {'mean ms':>10}")
+        for name, fields in FIELD_SETS.items():
+            body: dict = {"lon": args.lon, "lat": args.lat}
+            if fields is not None:
+                body["fields"] = fields
+            # warm up
+            measure(client, body, 5)
+            size, latency = measure(client, body, args.requests)
+            print(f"{name:<20} {size:>10} {latency:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--lon", type=float, default=-79)
+    parser.add_argument("--lat", type=float, default=45)
+    main(parser.parse_args())
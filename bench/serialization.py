@@ -0,0 +1,158 @@
+import argparse
+import datetime
+import timeit
+
+import bson
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from api.db import weather_doc_to_dict
+from api.serialize import encode_json, orjson
+
+"""
+Microbenchmark of response serialization for a large forecast report.
+
+Compares the previous path (weather_doc_to_dict, jsonable_encoder,
+JSONResponse) with api.serialize.encode_json. Both start from the raw BSON
+bytes a shard would send, so decoding is included. Run from the project
+root:
+    python -m bench.serialization
+"""
+
+
+def _value(text: str, units: str = "C") -> dict:
+    return {"text": text, "unitType": "metric", "units": units}
+
+
+def _forecast(idx: int) -> dict:
+    return {
+        "period": {"text": f"Period {idx}", "textForecastName": "Today"},
+        "textSummary": "Cloudy. 60 percent chance of flurries. "
+                       "Wind northwest 20 km/h gusting to 40. High minus 5.",
+        "cloudPrecip": {
+            "textSummary": "Cloudy. 60 percent chance of flurries."
+        },
+        "abbreviatedForecast": {
+            "iconCode": {"format": "gif", "text": "16"},
+            "pop": _value("60", "%"),
+            "textSummary": "Chance of flurries"
+        },
+        "temperatures": {
+            "textSummary": "High minus 5.",
+            "temperature": _value("-5")
+        },
+        "winds": {
+            "textSummary": "Wind northwest 20 km/h gusting to 40.",
+            "wind": [{
+                "speed": _value("20", "km/h"),
+                "gust": _value("40", "km/h"),
+                "direction": "NW"
+            }]
+        },
+        "precipitation": {"textSummary": "", "precipType": {"text": "snow"}},
+        "windChill": {
+            "textSummary": "Wind chill minus 15.",
+            "calculated": _value("-15")
+        },
+        "relativeHumidity": _value("75", "%"),
+    }
+
+
+def _hourly(idx: int) -> dict:
+    return {
+        "dateTimeUTC": f"202303261{idx % 10}00",
+        "condition": "Cloudy",
+        "iconCode": {"format": "png", "text": "10"},
+        "temperature": _value("-4"),
+        "lop": _value("40", "%"),
+        "windChill": _value("-12"),
+        "humidex": {},
+        "wind": {
+            "speed": _value("20", "km/h"),
+            "direction": "NW",
+            "gust": _value("", "km/h")
+        },
+    }
+
+
+def sample_report() -> dict:
+    """A report shaped like the Environment Canada citypage documents."""
+    return {
+        "_id": ObjectId(),
+        "license": "https://dd.weather.gc.ca/doc/LICENCE_GENERAL.txt",
+        "timestamp": datetime.datetime(2023, 3, 26, 12),
+        "geolocation": {"type": "Point", "coordinates": [-79.4, 43.7]},
+        "stationLongitude": -79.4,
+        "location": {
+            "continent": "North America",
+            "country": {"code": "ca", "text": "Canada"},
+            "province": {"code": "on", "text": "Ontario"},
+            "name": {"code": "s0000458", "lat": "43.74N", "lon": "79.37W",
+                     "text": "Toronto"},
+            "region": "City of Toronto",
+        },
+        "dateTime": [{"name": "xmlCreation", "zone": "UTC",
+                      "year": "2023", "month": "03", "day": "26"}] * 2,
+        "warnings": {},
+        "currentConditions": {
+            "station": {
+                "code": "yyz", "text": "Toronto Pearson Int'l Airport"
+            },
+            "condition": "Mostly Cloudy",
+            "temperature": _value("-3.2"),
+            "dewpoint": _value("-9.1"),
+            "windChill": {"text": "-10", "unitType": "metric"},
+            "pressure": {"text": "101.9", "tendency": "rising",
+                         "unitType": "metric", "units": "kPa"},
+            "visibility": _value("24.1", "km"),
+            "relativeHumidity": _value("64", "%"),
+            "wind": {"speed": _value("22", "km/h"),
+                     "gust": _value("", "km/h"),
+                     "direction": "NW", "bearing": _value("310.0", "degrees")},
+        },
+        "forecastGroup": {"forecast": [_forecast(i) for i in range(13)]},
+        "hourlyForecastGroup": {
+            "hourlyForecast": [_hourly(i) for i in range(24)]
+        },
+        "yesterdayConditions": {"temperature": [_value("2.1"), _value("-6.4")],
+                                "precip": _value("0.4", "mm")},
+        "riseSet": {"disclaimer": "",
+                    "dateTime": [{"name": "sunrise", "hour": "07"}] * 4},
+        "almanac": {"temperature": [_value("19.3")] * 6,
+                    "precipitation": [_value("21.1", "mm")] * 2,
+                    "pop": _value("", "%")},
+    }
+
+
+def current_path(raw: bytes) -> bytes:
+    doc: dict = bson.decode(raw)
+    return JSONResponse(content=jsonable_encoder(weather_doc_to_dict(doc)))\
+        .body
+
+
+def fast_path(raw: bytes) -> bytes:
+    return encode_json(bson.decode(raw))
+
+
+def main(args: argparse.Namespace):
+    raw: bytes = bson.encode(sample_report())
+    print(f"report: {len(raw)} bytes of BSON, "
+          f"{len(fast_path(raw))} bytes of JSON")
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
+
+    results: dict[str, float] = {}
+    for name, func in [("current", current_path), ("fast", fast_path)]:
+        best: float = min(timeit.repeat(
+            lambda: func(raw), number=args.number, repeat=args.repeat
+        ))
+        results[name] = 1e6 * best / args.number
+        print(f"{name:<10} {results[name]:>10.1f} us/report")
+    print(f"speed-up   {results['current'] / results['fast']:>10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
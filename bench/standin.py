@@ -0,0 +1,143 @@
+import datetime
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from bson import ObjectId
+from pymongo.results import InsertOneResult
+
+from api.config import SEARCH_RADIUS_M
+from api.db import normalize_report, with_distance, invalidate_cached, \
+    DISTANCE_FIELD
+from api.topology import RouterEndpoint
+from api.zones import longitude_range, distance_m
+
+"""
+An in-memory stand-in for the cluster, for load tests without Docker.
+
+It replaces the database calls the API makes (check_weather,
+check_weather_many, insert_weather, insert_weather_many) with the same
+signatures and return values, so everything above them runs unchanged: the
+request handlers, the executor, the cache, router selection and response
+encoding. The shard key handling, cache invalidation and distance logic from
+api.db and api.zones are reused. Each call sleeps for a fixed round trip to
+stand in for the network and the database.
+"""
+
+
+class StandInBackend:
+    latency: float
+    stations: dict[tuple[float, float], dict]
+
+    def __init__(self, latency_ms: float = 1.0):
+        self.latency = latency_ms / 1000
+        # latest report per station, and the stations sorted by longitude
+        self.stations = {}
+        self._lons: list[tuple[float, float]] = []
+        self._lock = threading.Lock()
+
+    def load(self, docs: list[dict]) -> int:
+        for doc in docs:
+            self._store(normalize_report(doc))
+        return len(docs)
+
+    def _store(self, doc: dict):
+        doc.setdefault("_id", ObjectId())
+        lon, lat = doc["geolocation"]["coordinates"][:2]
+        with self._lock:
+            current: dict | None = self.stations.get((lon, lat))
+            if current is None:
+                insort(self._lons, (lon, lat))
+            elif current.get("timestamp", datetime.datetime.min) \
+                    > doc.get("timestamp", datetime.datetime.min):
+                return
+            self.stations[(lon, lat)] = doc
+
+    def _nearest(self, lon: float, lat: float) -> tuple[dict, float] | None:
+        low, high = longitude_range(lon, lat, SEARCH_RADIUS_M)
+        best: tuple[dict, float] | None = None
+        with self._lock:
+            candidates: list[tuple[float, float]] = self._lons[
+                bisect_left(self._lons, (low, -90.0)):
+                bisect_right(self._lons, (high, 90.0))
+            ]
+        for s_lon, s_lat in candidates:
+            dist: float = distance_m(lon, lat, s_lon, s_lat)
+            if dist <= SEARCH_RADIUS_M and (best is None or dist < best[1]):
+                best = (self.stations[(s_lon, s_lat)], dist)
+        return best
+
+    @staticmethod
+    def _project(doc: dict, fields: list[str] | None) -> dict:
+        if fields is None:
+            return dict(doc)
+        top: set[str] = {field.split(".")[0] for field in fields}
+        return {
+            key: value for key, value in doc.items()
+            if key == "_id" or key in top
+        }
+
+    def _result(
+            self, match: tuple[dict, float] | None, fields: list[str] | None
+    ) -> dict | None:
+        if match is None:
+            return None
+        return with_distance(
+            self._project(match[0], fields), {DISTANCE_FIELD: match[1]},
+            fields
+        )
+
+    def check_weather(
+            self, router: RouterEndpoint, lon: float, lat: float,
+            fields: list[str] | None = None
+    ) -> dict | None:
+        time.sleep(self.latency)
+        return self._result(self._nearest(lon, lat), fields)
+
+    def check_weather_many(
+            self, router: RouterEndpoint, points: list[tuple[float, float]],
+            fields: list[str] | None = None
+    ) -> list[dict | None]:
+        time.sleep(self.latency)
+        return [
+            self._result(self._nearest(lon, lat), fields)
+            for lon, lat in points
+        ]
+
+    def insert_weather(
+            self, router: RouterEndpoint, data: dict
+    ) -> InsertOneResult:
+        time.sleep(self.latency)
+        data = normalize_report(data)
+        self._store(data)
+        invalidate_cached([data])
+        return InsertOneResult(data["_id"], acknowledged=True)
+
+    def insert_weather_many(
+            self, router: RouterEndpoint, docs: list[dict]
+    ) -> list[dict]:
+        time.sleep(self.latency)
+        results: list[dict] = []
+        stored: list[dict] = []
+        for doc in docs:
+            try:
+                normalize_report(doc)
+            except ValueError as err:
+                results.append({"error": str(err)})
+                continue
+            self._store(doc)
+            stored.append(doc)
+            results.append({"_id": str(doc["_id"])})
+        invalidate_cached(stored)
+        return results
+
+    def install(self):
+        """Routes the API's database calls to this backend."""
+        import api.main
+
+        api.main.check_weather = self.check_weather
+        api.main.check_weather_many = self.check_weather_many
+        api.main.insert_weather = self.insert_weather
+        api.main.insert_weather_many = self.insert_weather_many
+        # every router is always up; no probes are sent
+        api.main.HEALTH_MONITOR.ensure_started = lambda: None
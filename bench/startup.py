@@ -0,0 +1,61 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+"""
+Cold-start time of the API.
+
+Each sample starts a fresh interpreter, so nothing is cached between runs:
+- import: time to import api.main
+- ready: time until the app has run its startup handlers and answered a
+  request (GET /admin/routers), which needs no database round trip.
+  Shutdown is not included.
+
+Run from the project root:
+    python -m bench.startup
+"""
+
+IMPORT_SCRIPT: str = """
+import time
+import api.main
+print(time.time())
+"""
+
+READY_SCRIPT: str = """
+import time
+from starlette.testclient import TestClient
+from api.main import app
+with TestClient(app) as client:
+    client.get("/admin/routers").raise_for_status()
+    print(time.time())
+"""
+
+
+def sample(script: str) -> float:
+    # wall clock, so the child can report when it was ready
+    start: float = time.time()
+    output: str = subprocess.run(
+        [sys.executable, "-c", script],
+        check=True, capture_output=True, text=True
+    ).stdout.strip()
+    end: float = float(output) if output else time.time()
+    return end - start
+
+
+def main(args: argparse.Namespace):
+    baseline: list[float] = [sample("pass") for _ in range(args.runs)]
+    print(f"interpreter alone: {1000 * statistics.median(baseline):.0f} ms")
+    for name, script in [("import", IMPORT_SCRIPT), ("ready", READY_SCRIPT)]:
+        runs: list[float] = [sample(script) for _ in range(args.runs)]
+        print(
+            f"{name:<8} median {1000 * statistics.median(runs):>7.0f} ms, "
+            f"max {1000 * max(runs):>7.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    main(parser.parse_args())
@@ -1,30 +1,40 @@
+from api.db import DB_NAME
+from api.indexes import INDEXES, IndexManager, print_progress
 from demo.D00_init_server_setup import TOR_ROUTER
 
-DB_NAME: str = "env-canada"
-COLLECTION_NAME: str = "weather"
-
-LOCATION_FIELD: str = "geolocation"
-TIMESTAMP_FIELD: str = "timestamp"
-
 conn = TOR_ROUTER.connect()
-collection = conn\
-    .get_database(DB_NAME)\
-    .get_collection(COLLECTION_NAME)
 
 """
 Demo notes:
-We create two indices on geolocation and timestamp.
+The indexes the API needs are declared in api/indexes.py, each with the query
+it serves:
+- weather: a 2dsphere index on geolocation compounded with timestamp, and a
+compound index on (geolocation, timestamp)
+- weather_latest: a 2dsphere index on geolocation, and an index on the
+station longitude
 
 These improve the performance of querying the most recent data from the nearest 
-weather station to the user's location.
-"""
+weather station to the user's location. Timestamps are stored as BSON dates
+(the API converts them on insert), so a time condition on the nearest station
+search, e.g. reports from the last day, is answered from the same index as
+the distance.
 
-print("Creating geolocation index")
-output = collection.create_index([(LOCATION_FIELD, "2dsphere")])
-print(f"  Output: {output}")
+The API finds the nearest station with the 2dsphere index, then fetches that
+station's most recent report. The (geolocation, timestamp) index answers the
+second step with a single index seek, however much history the station has.
 
-print("Creating timestamp index")
-output = collection.create_index([(TIMESTAMP_FIELD, -1)])
-print(f"  Output: {output}")
+weather_latest holds one document per weather station, pointing at its newest
+report. The API keeps it up to date on every insert and runs the nearest
+station search against it.
+
+Later, python -m api.indexes compares the declarations with every shard,
+builds what is missing and flags indexes that are never used.
+"""
+manager = IndexManager(conn.get_database(DB_NAME))
+for spec in INDEXES:
+    print(f"Creating {spec.collection} index {spec.name}")
+    print(f"  Serves {spec.purpose}")
+    output = manager.build(spec, on_progress=print_progress)
+    print(f"  Output: {output}")
 
 conn.close()
@@ -1,9 +1,11 @@
 import time
 
+from base.readiness import DOWN, READY, SECONDARY
 from demo.D00_init_server_setup import TOR_ROUTER, MON_ROUTER, WIN_ROUTER, \
     ON_REPLSET, ON_REPL_MON, ON_REPL_WIN
 from demo.simple_data import insert_sample_data, clear_data, \
-    query_from_windsor, query_from_cornwall, print_demo_title
+    query_from_windsor, query_from_cornwall, print_demo_title, \
+    expect_within, WAIT_TIMEOUT_S
 
 """
 Demo notes:
@@ -73,8 +75,12 @@ print_demo_title(2, "bringing down routers")
 print("Bringing Toronto and Montreal routers offline")
 TOR_ROUTER.shutdown()
 MON_ROUTER.shutdown()
-while TOR_ROUTER.healthy() or MON_ROUTER.healthy():
-    time.sleep(2)
+expect_within(
+    TOR_ROUTER.wait_until(DOWN, WAIT_TIMEOUT_S), "the Toronto router"
+)
+expect_within(
+    MON_ROUTER.wait_until(DOWN, WAIT_TIMEOUT_S), "the Montreal router"
+)
 print("  Toronto and Montreal routers offline")
 input("Press enter to continue")
 
@@ -84,11 +90,13 @@ query_from_windsor()
 
 print("Bringing Winnipeg router offline and Montreal router online")
 MON_ROUTER.startup()
-while not MON_ROUTER.healthy():
-    time.sleep(2)
+expect_within(
+    MON_ROUTER.wait_until(READY, WAIT_TIMEOUT_S), "the Montreal router"
+)
 WIN_ROUTER.shutdown()
-while WIN_ROUTER.healthy():
-    time.sleep(2)
+expect_within(
+    WIN_ROUTER.wait_until(DOWN, WAIT_TIMEOUT_S), "the Winnipeg router"
+)
 print("  Winnipeg router offline and Montreal router online")
 input("Press enter to continue")
 
@@ -97,8 +105,12 @@ query_from_cornwall()
 print("Bringing routers online")
 TOR_ROUTER.startup()
 WIN_ROUTER.startup()
-while not TOR_ROUTER.healthy() or not WIN_ROUTER.healthy():
-    time.sleep(2)
+expect_within(
+    TOR_ROUTER.wait_until(READY, WAIT_TIMEOUT_S), "the Toronto router"
+)
+expect_within(
+    WIN_ROUTER.wait_until(READY, WAIT_TIMEOUT_S), "the Winnipeg router"
+)
 print("  Routers online")
 
 clear_data()
@@ -122,9 +134,16 @@ print_demo_title(3, "bringing down data servers")
 print(f"Bringing down {ON_REPLSET.replica_set_name} primary data server "
       f"{ON_REPLSET.pref_primary.container_name}")
 ON_REPLSET.pref_primary.shutdown()
-while ON_REPLSET.pref_primary.healthy():
-    time.sleep(1)
+expect_within(
+    ON_REPLSET.pref_primary.wait_until(DOWN, WAIT_TIMEOUT_S),
+    "the primary data server"
+)
 print("  Data server is down")
+print("Waiting for a new primary to be elected...")
+expect_within(
+    ON_REPLSET.wait_for_primary(WAIT_TIMEOUT_S), "a new primary"
+)
+print("  New primary elected")
 input("Press enter to continue")
 
 insert_sample_data()
@@ -133,20 +152,29 @@ insert_sample_data()
 print("Cycling primary data server for replication")
 print("  Bringing up primary data server")
 ON_REPLSET.pref_primary.startup()
-while not ON_REPLSET.pref_primary.healthy():
-    time.sleep(2)
-
-time.sleep(10)
+expect_within(
+    ON_REPLSET.pref_primary.wait_until(SECONDARY, WAIT_TIMEOUT_S),
+    "the primary data server to rejoin"
+)
+# it has to hold the writes made while it was down before it goes again
+print("  Waiting for it to catch up with the new primary")
+expect_within(
+    ON_REPLSET.pref_primary.wait_for_catch_up(WAIT_TIMEOUT_S),
+    "the primary data server to catch up"
+)
 
 print("  Bringing down primary data server")
 ON_REPLSET.pref_primary.shutdown()
-while ON_REPLSET.pref_primary.healthy():
-    time.sleep(1)
+expect_within(
+    ON_REPLSET.pref_primary.wait_until(DOWN, WAIT_TIMEOUT_S),
+    "the primary data server"
+)
 
 print(f"Bringing down Winnipeg data server")
 ON_REPL_WIN.shutdown()
-while ON_REPL_WIN.healthy():
-    time.sleep(1)
+expect_within(
+    ON_REPL_WIN.wait_until(DOWN, WAIT_TIMEOUT_S), "the Winnipeg data server"
+)
 print("  Brought down Winnipeg data server")
 
 query_from_cornwall()
@@ -162,11 +190,14 @@ Demo notes
 """
 print("Bringing up Winnipeg data server for writes")
 ON_REPL_WIN.startup()
-while not ON_REPL_WIN.healthy():
-    time.sleep(1)
+expect_within(
+    ON_REPL_WIN.wait_until(READY, WAIT_TIMEOUT_S),
+    "the Winnipeg data server"
+)
 print("  Winnipeg data server is up")
+print("Waiting for a primary to be elected...")
+expect_within(ON_REPLSET.wait_for_primary(WAIT_TIMEOUT_S), "a primary")
+print("  Primary elected")
 input("Press enter to continue")
 
-time.sleep(10)
-
 clear_data()
\ No newline at end of file
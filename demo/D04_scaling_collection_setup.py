@@ -1,20 +1,20 @@
 from bson import MinKey, MaxKey
 
+from api.db import DB_NAME, COLLECTION_NAME
+from api.indexes import IndexManager
+from api.schema import SHARD_KEY_INDEX
+from api.zones import SHARD_KEY, TBAY_LON, OTT_LON
 from base.db_logical import ShardServerReplicaSet
 from demo.D00_init_server_setup import TOR_ROUTER, ON_REPLSET
-from demo.D01_init_collection_setup import DB_NAME, COLLECTION_NAME
 from demo.D03_scaling_server_setup import MB_REPLSET, QC_REPLSET
 
 # 1. Shard Collection
 
 print("Creating shard key index (longitude of weather station)")
 conn = TOR_ROUTER.connect()
-collection = conn\
-    .get_database(DB_NAME)\
-    .get_collection(COLLECTION_NAME)
 
-SHARD_KEY = "stationLongitude"
-output = collection.create_index([(SHARD_KEY, 1)])
+# declared in api/indexes.py; already there if D01 built every index
+output = IndexManager(conn.get_database(DB_NAME)).build(SHARD_KEY_INDEX)
 print(f"  Output: {output}")
 print(f"  Shard key index created on {SHARD_KEY}")
 
@@ -46,8 +46,6 @@ for repl_set in repl_sets:
 print("  Zones created")
 
 print("Partitioning zones")
-TBAY_LON = -89.3
-OTT_LON = -75.7
 
 print(f"Partitioning {MB_REPLSET.replica_set_name} zone west of Thunder Bay")
 output = conn.admin.command(
@@ -86,6 +84,8 @@ conn.close()
 You are now ready to scrape data
 - start the api server from the root directory of this project
     - uvicorn api.main:app
+    - it connects to the routers created in D00 unless API_ROUTERS or
+    API_TOPOLOGY_FILE say otherwise (see api/topology.py)
 - start the weather scraper, and let it run for a while
 - data will be partitioned across the 3 replica sets
 """
\ No newline at end of file
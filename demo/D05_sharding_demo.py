@@ -1,8 +1,8 @@
 import json
 from random import randint
 
+from api.db import DB_NAME, COLLECTION_NAME
 from demo.D00_init_server_setup import TOR_ROUTER, ON_REPL_TOR
-from demo.D01_init_collection_setup import DB_NAME, COLLECTION_NAME
 from demo.D03_scaling_server_setup import MB_REPL_WIN, QC_REPL_MON
 from demo.simple_data import print_demo_title
 
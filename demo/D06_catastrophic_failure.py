@@ -1,8 +1,8 @@
-import time
-
+from base.readiness import DOWN
 from demo.D00_init_server_setup import TOR_ROUTER, TOR_CFG, ON_REPL_TOR
 from demo.D03_scaling_server_setup import MB_REPL_TOR, QC_REPL_TOR
-from demo.simple_data import print_demo_title
+from demo.simple_data import print_demo_title, expect_within, \
+    WAIT_TIMEOUT_S
 
 print()
 print_demo_title(1, "DISASTER HAS STRUCK TORONTO")
@@ -22,8 +22,9 @@ for server in servers:
 print()
 
 for server in servers:
-    while server.healthy():
-        time.sleep(1)
+    expect_within(
+        server.wait_until(DOWN, WAIT_TIMEOUT_S), server.container_name
+    )
 print()
 
 print("Toronto is down!")
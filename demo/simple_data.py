@@ -3,7 +3,10 @@ from datetime import datetime
 from bson import ObjectId
 from starlette.testclient import TestClient
 
+from api.cache import WEATHER_CACHE
+from api.clients import CLIENT_REGISTRY
 from api.db import DB_NAME, COLLECTION_NAME
+from api.latest import LATEST_COLLECTION_NAME
 from api.main import app, get_router
 from demo.D00_init_server_setup import TOR_ROUTER
 
@@ -37,6 +40,9 @@ CORNWALL_LOC: dict = {
     "lon": -74, "lat": 45
 }
 
+# how long a demo waits for a server or replica set before giving up
+WAIT_TIMEOUT_S: float = 120
+
 sample_data = [
     {
         "location": "OTTAWA",
@@ -96,17 +102,29 @@ def query_from_windsor():
 
 def clear_data():
     print("Deleting all sample data...")
-    conn = get_router().connect()
+    conn = CLIENT_REGISTRY.get_client(get_router())
     collection = conn.get_database(DB_NAME) \
         .get_collection(COLLECTION_NAME)
 
+    latest = conn.get_database(DB_NAME) \
+        .get_collection(LATEST_COLLECTION_NAME)
+
     for data in sample_data:
         collection.find_one_and_delete({"_id": data["_id"]})
+        latest.delete_many({"reportId": data["_id"]})
         del data["_id"]
+    WEATHER_CACHE.clear()
 
-    conn.close()
     print("  Data deleted")
 
 
 def print_demo_title(idx: int, message: str):
-    print(f"\n-----DEMO {idx}: {message.upper()}-----")
\ No newline at end of file
+    print(f"\n-----DEMO {idx}: {message.upper()}-----")
+
+
+def expect_within(reached: bool, what: str):
+    """Fails the demo if a wait on a server returned False."""
+    if not reached:
+        raise TimeoutError(
+            f"Timed out after {WAIT_TIMEOUT_S:g} s waiting for {what}"
+        )